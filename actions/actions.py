@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-import random
 from typing import TYPE_CHECKING
 
 import utils.color
+import utils.rng
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -71,7 +71,7 @@ class AddEntity(Action):
         self.entity = entity
 
     def perform(self):
-        self.section.entities.append(self.entity)
+        self.section.add_entity(self.entity)
 
 class DeleteEntity(Action):
     def __init__(self, engine, section, entity):
@@ -238,7 +238,7 @@ class MovementAction(EntityActionWithDirection):
         if not section.tiles["walkable"][dest_x, dest_y]:
             print(f"{self.entity.name}'s destination blocked by tile!")
             return  # Destination is blocked by a tile.
-        if section.get_blocking_entity_at_location(dest_x, dest_y):
+        if section.occupancy.is_blocked(dest_x, dest_y):
             print(f"{self.entity.name} destination blocked by an entity!")
             return  # Destination is blocked by an entity.
 
@@ -247,8 +247,9 @@ class MovementAction(EntityActionWithDirection):
 
         # Tile is worn down as an actor moves on to it
         if section.tiles[dest_x, dest_y]["wearable"]:
-            section.tiles[dest_x, dest_y]["wear"] = max(0, section.tiles[dest_x, dest_y]["wear"] - self.entity.weight * (random.random() * 0.0025))
+            section.tiles[dest_x, dest_y]["wear"] = max(0, section.tiles[dest_x, dest_y]["wear"] - self.entity.weight * (utils.rng.stream("gameplay", "wear").random() * 0.0025))
             section.tiles[dest_x, dest_y]["graphic"]["bg"] = utils.color.color_lerp(utils.color.DRY_MUD_BROWN, section.tiles[dest_x, dest_y]["original_bg"], section.tiles[dest_x, dest_y]["wear"])
+            section.mark_tiles_dirty(dest_x, dest_y)
 
 class BumpEntityAction(EntityActionWithDirection):
     def perform(self, section) -> None:
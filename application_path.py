@@ -5,4 +5,12 @@ def get_app_path():
         #Will only work if frozen with pyinstaller
         return sys._MEIPASS
     else:
-        return os.path.dirname(os.path.abspath(__file__))
\ No newline at end of file
+        return os.path.dirname(os.path.abspath(__file__))
+
+def get_cache_path():
+    if getattr(sys, 'frozen', False):
+        #The pyinstaller bundle is unpacked to a temporary folder that's deleted on exit, so keep caches in the user's cache folder
+        user_cache = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(user_cache, "ranter")
+    else:
+        return os.path.join(get_app_path(), "cache")
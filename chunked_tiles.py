@@ -0,0 +1,217 @@
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+##################################
+# A tile map split into fixed size chunks that are only generated when something reads them.
+# Chunks live in a dict keyed by (chunk_x, chunk_y), the least recently used ones are swapped out to disk once
+# more than max_loaded_chunks are in memory, and read back in the next time they're needed.
+#
+# ChunkedView gives the same indexing the game already uses on a plain tiles array:
+#   view[x, y]                  a single tile, writes through it land in the chunk
+#   view[x0:x1, y0:y1]          a copy of the tiles in the rectangle
+#   view["walkable"][x, y]      fields can be picked before indexing, at any depth
+#   view[x, y] = tile           and the same for slices and fields
+#   np.array(view["walkable"])  the whole map, see ChunkedTiles.read_loaded
+#
+# Because a slice is a copy, writing into a field of one (view[x0:x1, y0:y1]["walkable"] = True) changes the copy and is
+# lost. Pick the field first instead, view["walkable"][x0:x1, y0:y1] = True, which works on a plain array just the same.
+# A single tile (view[x, y]) is a view into its chunk, so view[x, y]["wear"] = 0 does land.
+##################################
+
+
+class ChunkedTiles:
+    def __init__(self, width, height, dtype, fill_value, generate_chunk, chunk_size=64, max_loaded_chunks=64):
+        """ generate_chunk(chunk, x, y) fills in a fresh chunk (already set to fill_value) whose top left tile is at x, y """
+        self.width = width
+        self.height = height
+        self.dtype = np.dtype(dtype)
+        self.fill_value = np.asarray(fill_value, dtype=self.dtype)
+        self.generate_chunk = generate_chunk
+        self.chunk_size = chunk_size
+        self.max_loaded_chunks = max_loaded_chunks
+
+        self.chunks = OrderedDict()
+        self.swapped_chunks = set()
+        self.swap_dir = tempfile.TemporaryDirectory(prefix="chunks-")
+
+    @property
+    def shape(self):
+        return (self.width, self.height)
+
+    def view(self, *path):
+        return ChunkedView(self, path)
+
+    def chunk_origin(self, chunk_x, chunk_y):
+        return chunk_x * self.chunk_size, chunk_y * self.chunk_size
+
+    def chunk_shape(self, chunk_x, chunk_y):
+        x, y = self.chunk_origin(chunk_x, chunk_y)
+        return min(self.chunk_size, self.width - x), min(self.chunk_size, self.height - y)
+
+    def chunk_range(self, start, stop):
+        return range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1)
+
+    def is_loaded(self, chunk_x, chunk_y):
+        return (chunk_x, chunk_y) in self.chunks
+
+    def get_chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        if key in self.swapped_chunks:
+            chunk = np.load(self.get_swap_path(key), allow_pickle=False)
+        else:
+            chunk = np.full(self.chunk_shape(chunk_x, chunk_y), fill_value=self.fill_value, order="F")
+            self.generate_chunk(chunk, *self.chunk_origin(chunk_x, chunk_y))
+
+        self.chunks[key] = chunk
+        self.evict_chunks()
+        return chunk
+
+    def evict_chunks(self):
+        while len(self.chunks) > self.max_loaded_chunks:
+            key, chunk = self.chunks.popitem(last=False)
+            np.save(self.get_swap_path(key), chunk, allow_pickle=False)
+            self.swapped_chunks.add(key)
+
+    def get_swap_path(self, key):
+        return os.path.join(self.swap_dir.name, "{}_{}.npy".format(*key))
+
+    def prefetch(self, x, y, width, height, margin=0):
+        """ Make sure every chunk within margin tiles of the rectangle is in memory """
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        x1, y1 = min(self.width, x + width + margin), min(self.height, y + height + margin)
+        for chunk_x in self.chunk_range(x0, x1):
+            for chunk_y in self.chunk_range(y0, y1):
+                self.get_chunk(chunk_x, chunk_y)
+
+    def read_point(self, path, x, y):
+        chunk = self.get_chunk(x // self.chunk_size, y // self.chunk_size)
+        return select(chunk, path)[x % self.chunk_size, y % self.chunk_size]
+
+    def read(self, path, xs, ys):
+        """ Copy of the tiles in range(*xs) by range(*ys), generating any chunks they cover """
+        template = select(np.empty((0, 0), dtype=self.dtype), path)
+        out = np.empty((xs[1] - xs[0], ys[1] - ys[0]) + template.shape[2:], dtype=template.dtype, order="F")
+
+        for (x0, x1, y0, y1), chunk, (cx, cy) in self.overlapping_chunks(xs, ys):
+            out[x0 - xs[0]:x1 - xs[0], y0 - ys[0]:y1 - ys[0]] = select(chunk, path)[x0 - cx:x1 - cx, y0 - cy:y1 - cy]
+
+        return out
+
+    def write(self, path, xs, ys, value):
+        value = np.asarray(value)
+        broadcast = value.ndim < 2 or value.shape[:2] != (xs[1] - xs[0], ys[1] - ys[0])
+
+        for (x0, x1, y0, y1), chunk, (cx, cy) in self.overlapping_chunks(xs, ys):
+            part = value if broadcast else value[x0 - xs[0]:x1 - xs[0], y0 - ys[0]:y1 - ys[0]]
+            select(chunk, path)[x0 - cx:x1 - cx, y0 - cy:y1 - cy] = part
+
+    def read_loaded(self, path):
+        """ The whole map, without generating anything. Chunks that haven't been generated yet read as fill_value,
+        swapped out chunks are read back from disk but not pulled back into memory. """
+        template = select(np.full((1, 1), self.fill_value), path)
+        out = np.empty((self.width, self.height) + template.shape[2:], dtype=template.dtype, order="F")
+        out[...] = template[0, 0]
+
+        for key in list(self.chunks.keys()) + list(self.swapped_chunks - self.chunks.keys()):
+            chunk = self.chunks[key] if key in self.chunks else np.load(self.get_swap_path(key), mmap_mode="r", allow_pickle=False)
+            x, y = self.chunk_origin(*key)
+            out[x:x + chunk.shape[0], y:y + chunk.shape[1]] = select(chunk, path)
+
+        return out
+
+    def overlapping_chunks(self, xs, ys):
+        for chunk_x in self.chunk_range(*xs):
+            for chunk_y in self.chunk_range(*ys):
+                cx, cy = self.chunk_origin(chunk_x, chunk_y)
+                chunk = self.get_chunk(chunk_x, chunk_y)
+                x0, x1 = max(xs[0], cx), min(xs[1], cx + chunk.shape[0])
+                y0, y1 = max(ys[0], cy), min(ys[1], cy + chunk.shape[1])
+                if x0 < x1 and y0 < y1:
+                    yield (x0, x1, y0, y1), chunk, (cx, cy)
+
+
+class ChunkedView:
+    def __init__(self, store, path=()):
+        self.store = store
+        self.path = tuple(path)
+
+    @property
+    def shape(self):
+        return self.store.shape
+
+    def __len__(self):
+        return self.store.width
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.store.read_loaded(self.path)
+        return array if dtype is None else array.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return ChunkedView(self.store, self.path + (key,))
+
+        (xs, x_is_int), (ys, y_is_int) = self.normalise_key(key)
+        if x_is_int and y_is_int:
+            return self.store.read_point(self.path, xs[0], ys[0])
+
+        if xs[0] >= xs[1] or ys[0] >= ys[1]:
+            template = select(np.empty((0, 0), dtype=self.store.dtype), self.path)
+            tiles = np.empty((max(0, xs[1] - xs[0]), max(0, ys[1] - ys[0])) + template.shape[2:], dtype=template.dtype)
+        else:
+            tiles = self.store.read(self.path, xs, ys)
+
+        if x_is_int:
+            return tiles[0]
+        if y_is_int:
+            return tiles[:, 0]
+        return tiles
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str):
+            self[key][:, :] = value
+            return
+
+        (xs, x_is_int), (ys, y_is_int) = self.normalise_key(key)
+        if xs[0] >= xs[1] or ys[0] >= ys[1]:
+            return
+
+        value = np.asarray(value)
+        if x_is_int != y_is_int and value.ndim > 0 and value.shape[0] == (ys[1] - ys[0] if x_is_int else xs[1] - xs[0]):
+            # A single row or column, put back the axis that was indexed away
+            value = value[np.newaxis] if x_is_int else value[:, np.newaxis]
+
+        self.store.write(self.path, xs, ys, value)
+
+    def normalise_key(self, key):
+        if not isinstance(key, tuple) or len(key) != 2:
+            raise IndexError("Chunked tiles must be indexed with [x, y]")
+
+        return self.normalise_axis(key[0], self.store.width), self.normalise_axis(key[1], self.store.height)
+
+    def normalise_axis(self, index, size):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            if step != 1:
+                raise IndexError("Chunked tiles don't support stepped slices")
+            return (start, max(start, stop)), False
+
+        index = int(index)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("Tile index " + str(index) + " is out of bounds for size " + str(size))
+        return (index, index + 1), True
+
+
+def select(array, path):
+    for field in path:
+        array = array[field]
+    return array
@@ -2,9 +2,9 @@ from effects.effect import Effect
 
 from tcod import Console
 from enum import auto, Enum
-from random import randrange
 
 import numpy as np
+import utils.rng
 
 class MeltWipeEffectType(Enum):
     WAVE_LEFT = auto()
@@ -32,7 +32,7 @@ class MeltWipeEffect(Effect):
             elif self.type == MeltWipeEffectType.WAVE_RIGHT:
                 self.col_trigger_times[-col - 1] = wave_step * col
             elif self.type == MeltWipeEffectType.RANDOM:
-                self.col_trigger_times[col] = wave_step * randrange(int(self.lifespan / 3))
+                self.col_trigger_times[col] = wave_step * utils.rng.stream("effects").integers(int(self.lifespan / 3))
         
     def render(self, console):
 
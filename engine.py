@@ -88,6 +88,7 @@ class Engine(abc.ABC):
         """ Renders the game to console """
         for section_key, section_value in self.get_active_sections():
             if section_key not in self.disabled_sections:
+                section_value.wait_until_loaded()
                 section_value.render(root_console)
 
         if self.full_screen_effect.in_effect == True:
@@ -100,6 +101,7 @@ class Engine(abc.ABC):
     def update(self):
         """ Engine update tick """
         for _, section in self.get_active_sections():
+            section.wait_until_loaded()
             section.update()
 
         self.delta_time.update_delta_time()
@@ -118,6 +120,11 @@ class Engine(abc.ABC):
        for _, section in self.get_active_sections():
             section.late_update()
 
+    def get_loading_progress(self):
+        """ How far the game sections are through any background loading, from 0 to 1 """
+        progress = [section.loading_progress() for section in self.game_sections.values()]
+        return min(progress) if len(progress) > 0 else 1.0
+
     def is_in_game(self):
         return self.state == GameState.IN_GAME
 
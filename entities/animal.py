@@ -32,7 +32,7 @@ class Animal(BaseComponent):
             death_message = f"{self.entity.name} is dead!"
 
         self.entity.char = "%"
-        self.entity.color = (191, 0, 0)
+        self.entity.fg_colour = (191, 0, 0)
         self.entity.blocks_movement = False
         self.entity.ai = None
         self.entity.name = f"remains of {self.entity.name}"
@@ -1,9 +1,13 @@
 import copy
 import random
+from functools import lru_cache
 from typing import Tuple, Type, TypeVar
 
+import numpy as np
+
 from entities.action_component import ActionComponent
 from entities.animal import Animal
+from entities.entity_store import StoredField, colour_from_column
 from entities.render_order import RenderOrder
 
 T = TypeVar("T", bound="Entity")
@@ -13,6 +17,22 @@ class Entity:
     A generic object to represent players, enemies, items, etc.
     """
 
+    # Kept in the section's EntityStore while the entity is in a section that has one
+    x = StoredField("x", int, int)
+    y = StoredField("y", int, int)
+    char = StoredField("ch", ord, chr)
+    bg_colour = StoredField("bg", None, colour_from_column)
+    fg_colour = StoredField("fg", None, colour_from_column)
+    colours_bg = StoredField("colours_bg", bool, bool, notify=True)
+    render_order = StoredField("render_order", lambda render_order: render_order.value, RenderOrder, notify=True)
+    blocks_movement = StoredField("blocks_movement", bool, bool, notify=True)
+    weight = StoredField("weight", int, int)
+    stored_fields = (x, y, char, bg_colour, fg_colour, colours_bg, render_order, blocks_movement, weight)
+
+    # Entities are spawned by the thousand, so they don't get a __dict__. Subclasses need __slots__ of their own for the same reason.
+    __slots__ = ("section", "store", "row", "id", "name", "physical_properties",
+                 "_x", "_y", "_char", "_bg_colour", "_fg_colour", "_colours_bg", "_render_order", "_blocks_movement", "_weight")
+
     def __init__(
         self,
         id: int = -1,
@@ -28,6 +48,12 @@ class Entity:
         physical_properties: list = [],
         weight: int = 0
     ):
+        # The section this entity has been added to, which is told whenever the entity moves or changes
+        self.section = None
+        # The store holding this entity's stored attributes and its row in it, see entities.entity_store
+        self.store = None
+        self.row = -1
+
         self.id = id
         self.x = x
         self.y = y
@@ -45,25 +71,50 @@ class Entity:
             self.physical_properties.append(component(self))
 
     def spawn(self: T, x: int, y: int) -> T:
-        """Spawn a copy of this instance at the given location."""
-        clone = copy.deepcopy(self)
-        clone.x = x
-        clone.y = y
+        """Spawn a copy of this instance at the given location.
+        The copy shares everything it can with this one (names, colours, on_touch and the like are never changed in place),
+        only the state each instance has to have to itself, like its components, is made fresh. """
+        cls = type(self)
+        clone = cls.__new__(cls)
+        for name in all_slots(cls):
+            try:
+                setattr(clone, name, getattr(self, name))
+            except AttributeError:
+                pass
 
-        return clone
+        if self.store is not None:
+            # This entity's stored attributes live in its store, so the copied locals are out of date
+            for field in self.stored_fields:
+                field.write_local(clone, field.__get__(self))
 
+        clone.section, clone.store, clone.row = None, None, -1
+        clone._x, clone._y = x, y
+        self.setup_clone(clone)
 
+        return clone
+
+    def setup_clone(self, clone) -> None:
+        """ Gives a freshly spawned copy of this entity its own per instance state """
+        clone.physical_properties = [type(component)(clone) for component in self.physical_properties]
 
     def move(self, dx: int, dy: int) -> None:
         # Move the entity by a given amount
+        old_x, old_y = self.x, self.y
         self.x += dx
         self.y += dy
 
+        if self.section is not None:
+            self.section.entity_moved(self, old_x, old_y)
+
     def place(self, x: int, y: int) -> None:
         #Place this entitiy at a new location.  Handles moving across GameMaps.
+        old_x, old_y = self.x, self.y
         self.x = x
         self.y = y
 
+        if self.section is not None:
+            self.section.entity_moved(self, old_x, old_y)
+
     def update(self):
         for component in self.physical_properties:
             component.perform()
@@ -79,6 +130,8 @@ class Entity:
 
 
 class Actor(Entity):
+    __slots__ = ("animal", "ai")
+
     def __init__(
         self,
         *,
@@ -113,6 +166,11 @@ class Actor(Entity):
         self.animal = animal
         self.animal.entity = self
 
+    def setup_clone(self, clone) -> None:
+        super().setup_clone(clone)
+        clone.animal = copy.copy(self.animal)
+        clone.animal.entity = clone
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -127,6 +185,8 @@ class Actor(Entity):
         return 1
 
 class Prop(Entity):
+    __slots__ = ()
+
     def __init__(
         self,
         id: int = -1,
@@ -158,6 +218,8 @@ class Prop(Entity):
         )
 
 class Touchable(Prop):
+    __slots__ = ("on_touch",)
+
     def __init__(
         self,
         id: int = -1,
@@ -189,3 +251,18 @@ class Touchable(Prop):
         )
 
         self.on_touch = on_touch
+
+
+@lru_cache(maxsize=None)
+def all_slots(cls) -> Tuple[str, ...]:
+    """ Every slot an instance of cls has, from cls and everything it inherits from """
+    return tuple(name for klass in reversed(cls.__mro__) for name in getattr(klass, "__slots__", ()))
+
+def spawn_many(prototype: T, coords, section=None) -> list:
+    """ Spawns a copy of prototype at each x, y in coords (an (n, 2) array or list of pairs),
+    adding them all to section in one go if one is given """
+    entities = [prototype.spawn(x, y) for x, y in np.asarray(coords, dtype=np.int64).reshape(-1, 2).tolist()]
+    if section is not None:
+        section.add_entities(entities)
+
+    return entities
@@ -0,0 +1,176 @@
+import numpy as np
+
+##################################
+# Column oriented storage for a section's entities.
+# Every entity added to a store gets a row, and its position, glyph, colours, render order, blocking and weight live in
+# one numpy array per attribute rather than on the entity itself, so movement, culling and drawing can work over
+# every entity at once with array operations. Entity objects stay the way the rest of the game talks to an entity,
+# their stored attributes (see StoredField) just read and write their row while they're in a store.
+# Rows are kept packed: removing an entity moves the last row into its place.
+##################################
+
+
+class StoredField:
+    """ An entity attribute that's kept on the entity itself until the entity is added to an EntityStore,
+    and in the store's column from then on. to_column and from_column convert between the two. """
+    def __init__(self, column, to_column=None, from_column=None, notify=False):
+        self.column = column
+        self.to_column = to_column
+        self.from_column = from_column
+        # Tell the entity's section when this attribute changes, see Section.entity_changed
+        self.notify = notify
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.local = "_" + name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+
+        store = entity.store
+        if store is None:
+            return getattr(entity, self.local)
+
+        value = getattr(store, self.column)[entity.row]
+        return self.from_column(value) if self.from_column is not None else value
+
+    def __set__(self, entity, value):
+        store = entity.store
+        if store is None:
+            setattr(entity, self.local, value)
+        else:
+            getattr(store, self.column)[entity.row] = self.to_column(value) if self.to_column is not None else value
+
+        if self.notify and entity.section is not None:
+            entity.section.entity_changed(entity)
+
+    def read_local(self, entity):
+        return getattr(entity, self.local)
+
+    def write_local(self, entity, value):
+        setattr(entity, self.local, value)
+
+
+def colour_from_column(colour):
+    return tuple(colour.tolist())
+
+
+class EntityStore:
+    # column name -> (dtype, shape of one value)
+    columns = {
+        "x": (np.int32, ()),
+        "y": (np.int32, ()),
+        "ch": (np.int32, ()),
+        "fg": (np.uint8, (3,)),
+        "bg": (np.uint8, (3,)),
+        "colours_bg": (bool, ()),
+        "render_order": (np.int8, ()),
+        "blocks_movement": (bool, ()),
+        "weight": (np.int32, ()),
+        # When the entity was added, rows get reordered by remove so this is what keeps ties in a stable order
+        "seq": (np.int64, ()),
+    }
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.count = 0
+        self.next_seq = 0
+        self.entities = []
+        for name, (dtype, shape) in self.columns.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return len(self.x)
+
+    def grow(self):
+        for name in self.columns:
+            old = getattr(self, name)
+            new = np.zeros((len(old) * 2,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, entity) -> int:
+        if entity.store is not None:
+            raise ValueError("Entity is already in a store")
+
+        # Read everything while the values still live on the entity, then hand the entity over to its row
+        values = [(field, field.read_local(entity)) for field in stored_fields(entity)]
+        if self.count == self.capacity:
+            self.grow()
+
+        row = self.count
+        self.count += 1
+        self.entities.append(entity)
+        entity.store, entity.row = self, row
+        self.seq[row] = self.next_seq
+        self.next_seq += 1
+        for field, value in values:
+            getattr(self, field.column)[row] = field.to_column(value) if field.to_column is not None else value
+
+        return row
+
+    def add_many(self, entities) -> slice:
+        """ add for a whole list of entities, a column at a time. Returns the slice of rows they were given. """
+        if not entities:
+            return slice(self.count, self.count)
+        if any(entity.store is not None for entity in entities):
+            raise ValueError("Entity is already in a store")
+
+        while self.count + len(entities) > self.capacity:
+            self.grow()
+
+        rows = slice(self.count, self.count + len(entities))
+        for field in stored_fields(entities[0]):
+            values = [field.read_local(entity) for entity in entities]
+            if field.to_column is not None:
+                values = [field.to_column(value) for value in values]
+            getattr(self, field.column)[rows] = values
+        self.seq[rows] = np.arange(self.next_seq, self.next_seq + len(entities))
+        self.next_seq += len(entities)
+
+        for row, entity in enumerate(entities, start=self.count):
+            entity.store, entity.row = self, row
+        self.entities.extend(entities)
+        self.count += len(entities)
+
+        return rows
+
+    def remove(self, entity):
+        if entity.store is not self:
+            return
+
+        # Give the entity its values back so it carries on working once it's out of the store
+        row = entity.row
+        values = [(field, field.__get__(entity)) for field in stored_fields(entity)]
+        entity.store, entity.row = None, -1
+        for field, value in values:
+            field.write_local(entity, value)
+
+        last = self.count - 1
+        if row != last:
+            for name in self.columns:
+                column = getattr(self, name)
+                column[row] = column[last]
+            moved = self.entities[last]
+            self.entities[row] = moved
+            moved.row = row
+
+        self.entities.pop()
+        self.count -= 1
+
+    def rows_in_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """ Rows of every entity inside a rectangle """
+        xs, ys = self.x[:self.count], self.y[:self.count]
+        return np.flatnonzero((xs >= x) & (xs < x + width) & (ys >= y) & (ys < y + height))
+
+    def entities_at_rows(self, rows):
+        return [self.entities[row] for row in rows.tolist()]
+
+
+def stored_fields(entity):
+    return type(entity).stored_fields
+
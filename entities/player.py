@@ -12,6 +12,8 @@ from entities.entity import Entity
 
 
 class Player(Entity):
+    __slots__ = ("direction",)
+
     def __init__(self, engine, x: int, y: int):
         self.direction = Direction.LEFT
         super().__init__(engine, x, y, chr(250), get_random_color())
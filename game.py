@@ -31,7 +31,7 @@ class Game(Engine):
         self.menu_sections = OrderedDict()
 
         self.game_sections = OrderedDict()
-        self.game_sections["TestMapSection"] = TestMapSection(self, 0,0, 200, 150)
+        self.game_sections["TestMapSection"] = TestMapSection(self, 0,0, 200, 150, background_generation=True, seed=1237)
         
         self.misc_sections = OrderedDict()
         self.misc_sections["notificationDialog"] = Notification(self, 7, 9, 37, 10)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import tile_types
+from landscape_generation import LandscapeChunk, LandscapeParameters, generate_landscape
+
+# Headless batch world generation, for trying out generation parameters over lots of seeds without starting the game.
+# Each seed runs in its own process, with no engine, section, window or sound, and is written to <output>/world_<seed>.npz
+# holding the tiles and artefact_tiles arrays plus the per stage timings (stage_names and stage_seconds).
+
+
+def generate_world(seed, width, height, parameters, output_dir):
+    """ Runs in a worker process, returns the seed and how long generation took """
+    landscape = LandscapeChunk(
+        np.full((width, height), fill_value=tile_types.background_tile, order="F"),
+        np.full((width, height), fill_value=ord(" "), order="F"))
+
+    stages = generate_landscape(landscape, seed=seed, parameters=LandscapeParameters(**parameters), use_cache=False)
+
+    np.savez_compressed(
+        os.path.join(output_dir, "world_{}.npz".format(seed)),
+        tiles=landscape.tiles,
+        artefact_tiles=landscape.artefact_tiles,
+        stage_names=np.array(list(stages.timings.keys())),
+        stage_seconds=np.array(list(stages.timings.values())))
+
+    return seed, sum(stages.timings.values())
+
+def parse_seeds(args):
+    seeds = list(args.seeds)
+    if args.seed_range is not None:
+        seeds += list(range(*args.seed_range))
+    return seeds
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate worlds for a list or range of seeds without starting the game.")
+    parser.add_argument("seeds", type=int, nargs="*", help="seeds to generate")
+    parser.add_argument("--seed-range", type=int, nargs=2, metavar=("START", "STOP"), help="generate every seed from START up to (not including) STOP")
+    parser.add_argument("--width", type=int, default=200)
+    parser.add_argument("--height", type=int, default=150)
+    parser.add_argument("--parameters", type=json.loads, default={}, help="json object of LandscapeParameters values, e.g. '{\"noise_threshold\": 0.8}'")
+    parser.add_argument("--output", default="generated_worlds", help="directory to write the worlds to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes, defaults to one per core")
+    args = parser.parse_args()
+
+    seeds = parse_seeds(args)
+    if len(seeds) == 0:
+        parser.error("no seeds given")
+
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(generate_world, seed, args.width, args.height, args.parameters, args.output) for seed in seeds]
+        for future in as_completed(futures):
+            seed, seconds = future.result()
+            print("Seed {} generated in {:.1f}ms".format(seed, seconds * 1000))
+
+    print("Generated {} worlds in {:.1f}s".format(len(seeds), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
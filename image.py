@@ -1,7 +1,6 @@
 
 import numpy as np
 import xp_loader
-import gzip
 import tile_types
 import os
 
@@ -10,20 +9,9 @@ class Image():
     def __init__(self, width, height, xp_filepath):
         self.tiles = np.full((width, height),fill_value=tile_types.background_tile, order="F")
         if os.path.isfile(xp_filepath):
-            xp_file = gzip.open(xp_filepath)
-            raw_data = xp_file.read()
-            xp_file.close()
+            layer = xp_loader.load_xp_file(xp_filepath, layers={0})['layer_data'][0]
+            width, height = min(width, layer['width']), min(height, layer['height'])
 
-            xp_data = xp_loader.load_xp_string(raw_data)
-
-            for h in range(0, height):
-                if h < xp_data['height']:
-                    for w in range(0, width):
-                        if w < xp_data['width']:
-                            self.tiles[w, h]['graphic'] = xp_data['layer_data'][0]['cells'][w][h]
-                        else:
-                            break
-                else:
-                    break
+            self.tiles[:width, :height]['graphic'] = layer['graphic'][:width, :height]
         else:
             print("Tried to load \"" + xp_filepath + "\" but it doesn't exist!")
\ No newline at end of file
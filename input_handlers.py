@@ -55,6 +55,7 @@ class MainGameEventHandler(EventHandler):
         key = event.sym
 
         for _, section in self.engine.get_active_ui_sections():
+            section.wait_until_loaded()
             section.keydown(key)
             if section.ui is not None:
                 section.ui.keydown(event)
@@ -0,0 +1,298 @@
+import os.path
+import time
+from collections import OrderedDict
+
+import numpy as np  # type: ignore
+import tcod.noise
+import utils.color
+import utils.color_array
+import world_cache
+import xp_loader
+from application_path import get_app_path
+from utils.regions import Regions, colour_mask, neighbour_count
+from utils.rng import RandomStreams
+from utils.voronoi import Voronoi
+
+##################################
+# Landscape generation, kept apart from the sections so it can run anywhere: a section's worker thread,
+# generate_worlds.py's worker processes, or a chunk being generated on demand. Nothing here needs an engine or a section.
+# A landscape is anything with tiles, artefact_tiles, width and height (a MapSection or a LandscapeChunk).
+##################################
+
+painted_grids = ('/images/gridTL.xp','/images/gridTR.xp','/images/gridBL.xp','/images/gridBR.xp')
+painted_grid_width = 100
+painted_grid_height = 75
+
+# Stages of generate_landscape in the order they run, used to report how far through generation is
+landscape_generation_stages = ("voronoi", "draw_voronoi", "voronoi_fill_points", "clear_landscape", "smooth_noise", "noise", "painted_tiles", "save_original_color", "save_cached_world")
+
+
+class PaintRule():
+    """ What a marker on layer 2 of a painted grid does to the tile under it.
+    Anything left as None is not touched, colour ranges are (start, end) pairs that each tile gets a random point between. """
+    def __init__(self, walkable=None, ch=None, fg_range=None, bg_range=None) -> None:
+        self.walkable = walkable
+        self.ch = ch
+        self.fg_range = fg_range
+        self.bg_range = bg_range
+
+
+paint_rules = {}
+paint_rules[ord("r")] = PaintRule(fg_range=(utils.color.DRY_MUD_BROWN, utils.color.DRY_MUD_BROWN_B))
+paint_rules[ord("h")] = PaintRule(walkable=False, bg_range=(utils.color.LIGHT_HEDGE, utils.color.DARK_HEDGE))
+paint_rules[ord("g")] = PaintRule(bg_range=(utils.color.GRASS_GREEN, utils.color.DARK_GREEN))
+paint_rules[ord("c")] = PaintRule(ch=ord("ò"), fg_range=(utils.color.CROP_LIGHT, utils.color.CROP_DARK), bg_range=(utils.color.CROP_LIGHT, utils.color.CROP_DARK))
+paint_rules[ord("b")] = PaintRule(walkable=False, fg_range=(utils.color.BLACK, utils.color.BLACK), bg_range=(utils.color.WALL_BG, utils.color.GREY))
+paint_rules[ord("w")] = PaintRule(walkable=False, ch=ord("ò"), fg_range=(utils.color.LIGHT_WATER, utils.color.DARK_WATER), bg_range=(utils.color.LIGHT_WATER, utils.color.DARK_WATER))
+
+
+class LandscapeParameters():
+    """ Everything besides the seed that shapes a generated landscape. Generated worlds are cached against these values, so they must stay json friendly. """
+    def __init__(self, voronoi_towers=40, smooth_noise_scale=0.05, noise_threshold=0.9, noise_hurst=0.5, noise_lacunarity=5.0, noise_octaves=2) -> None:
+        self.voronoi_towers = voronoi_towers
+        self.smooth_noise_scale = smooth_noise_scale
+        self.noise_threshold = noise_threshold
+        self.noise_hurst = noise_hurst
+        self.noise_lacunarity = noise_lacunarity
+        self.noise_octaves = noise_octaves
+
+
+class LandscapeChunk():
+    """ Stands in for a whole map section when a generation stage is run over just one chunk of it """
+    def __init__(self, tiles, artefact_tiles) -> None:
+        self.tiles = tiles
+        self.artefact_tiles = artefact_tiles
+        self.width, self.height = tiles.shape
+
+
+class GenerationStages():
+    """ Runs the stages of a generation, timing each one and keeping track of how far through it is.
+    progress can be read from another thread while the stages run. """
+    def __init__(self) -> None:
+        self.timings = OrderedDict()
+        self.progress = 0.0
+
+    def run(self, name, stage, *args):
+        start = time.perf_counter()
+        result = stage(*args)
+        self.timings[name] = time.perf_counter() - start
+
+        if name in landscape_generation_stages:
+            self.progress = (landscape_generation_stages.index(name) + 1) / len(landscape_generation_stages)
+
+        return result
+
+    def print_timings(self):
+        print("Landscape generated in {:.1f}ms".format(sum(self.timings.values()) * 1000))
+        for name, seconds in self.timings.items():
+            print("  {:<20} {:8.2f}ms".format(name, seconds * 1000))
+
+
+def generate_landscape(landscape, seed=1237, parameters=None, use_cache=True, stages=None) -> GenerationStages:
+    """ Generates a whole landscape in place, returning the GenerationStages it ran with """
+    if parameters is None:
+        parameters = LandscapeParameters()
+    if stages is None:
+        stages = GenerationStages()
+
+    map_width, map_height = landscape.width, landscape.height
+
+    world_key = world_cache.get_world_key(seed, map_width, map_height, vars(parameters), [get_app_path() + grid for grid in painted_grids])
+    if use_cache:
+        cached_world = stages.run("load_cached_world", world_cache.load_world, world_key)
+        if cached_world is not None:
+            landscape.tiles, landscape.artefact_tiles = cached_world
+            stages.progress = 1.0
+            return stages
+
+    # Every stage draws from its own stream, so changing how much one stage draws doesn't reshuffle the others
+    streams = RandomStreams(seed)
+
+    # Generate and draw a voronoi diagram, then grab the points from a few of its sections to fill later
+    vorgen = stages.run("voronoi", Voronoi, parameters.voronoi_towers, np.array([-1, map_width + 1, -1, map_height + 1]), streams.stream("voronoi"))
+    stages.run("draw_voronoi", draw_voronoi, vorgen, landscape, utils.color.WHITE)
+    voronoi_fill_points = stages.run("voronoi_fill_points", get_voronoi_fill_points, streams.stream("voronoi_fill_points").integers(3, 6), vorgen, landscape)
+
+    stages.run("clear_landscape", clear_landscape, landscape, utils.color.GRASS_GREEN, utils.color.DARK_GREEN, streams.stream("clear_landscape"))
+
+    noise = make_landscape_noise(seed, parameters)
+
+    # Add a base layer of smooth, gradually changing noise to form base layer
+    stages.run("smooth_noise", add_smooth_noise_to_landscape, landscape, noise, parameters.smooth_noise_scale, utils.color.GRASS_GREEN, utils.color.DARK_GREEN)
+
+    # Shade the voronoi sections we grabbed before now we have our base layer down
+    #fill_regions(landscape, voronoi_fill_points, utils.color.DRY_MUD_BROWN, utils.color.WET_MUD_BROWN, utils.color.DARK_GREEN, utils.color.DRY_MUD_BROWN_B, streams.stream("fill_regions"))
+
+    # Add more granular noise on top to break things up
+    stages.run("noise", add_noise_to_landscape, landscape, noise, parameters.noise_threshold, utils.color.GRASS_GREEN, utils.color.DARK_GREEN, streams.stream("noise"))
+
+    stages.run("painted_tiles", add_painted_tiles, landscape, streams.stream("painted_tiles"))
+
+    # Save this version of the map so effects can happen to it over the course of the game
+    stages.run("save_original_color", save_original_color, landscape)
+
+    if use_cache:
+        stages.run("save_cached_world", world_cache.save_world, world_key, landscape.tiles, landscape.artefact_tiles)
+
+    stages.progress = 1.0
+    return stages
+
+def make_landscape_noise(seed, parameters):
+    return tcod.noise.Noise(
+        dimensions=2,
+        algorithm=tcod.NOISE_PERLIN,
+        implementation=tcod.noise.TURBULENCE,
+        hurst=parameters.noise_hurst,
+        lacunarity=parameters.noise_lacunarity,
+        octaves=parameters.noise_octaves,
+        seed=seed,
+    )
+
+def generate_landscape_chunk(landscape, origin, seed, parameters, noise):
+    """ Runs the per tile stages of generate_landscape over one chunk of a bigger map, origin being the chunk's top left tile.
+    Noise is sampled at map coordinates so chunks join up, and the chunk's random streams are derived from its position
+    so a chunk comes out the same whatever order (or thread) chunks are generated in.
+    The voronoi stages are skipped, clear_landscape paints over their result so they'd only cost time. """
+    streams = RandomStreams(seed).child("chunk", origin[0], origin[1])
+
+    clear_landscape(landscape, utils.color.GRASS_GREEN, utils.color.DARK_GREEN, streams.stream("clear_landscape"))
+    add_smooth_noise_to_landscape(landscape, noise, parameters.smooth_noise_scale, utils.color.GRASS_GREEN, utils.color.DARK_GREEN, origin)
+    add_noise_to_landscape(landscape, noise, parameters.noise_threshold, utils.color.GRASS_GREEN, utils.color.DARK_GREEN, streams.stream("noise"), origin)
+    add_painted_tiles(landscape, streams.stream("painted_tiles"), origin)
+    save_original_color(landscape)
+
+def clear_landscape(landscape, bg_colour, fg_colour, rng):
+    graphic = landscape.tiles["graphic"]
+    graphic["bg"] = bg_colour
+    graphic["ch"] = 9617
+    utils.color_array.random_lerp(bg_colour, fg_colour, out=graphic["fg"], rng=rng)
+
+
+def draw_voronoi(vorgen, landscape, colour):
+    landscape.tiles["graphic"]["bg"][vorgen.edge_mask(landscape.width, landscape.height)] = colour
+
+
+def get_voronoi_fill_points(num_regions, vorgen, landscape):
+    # Returns a mask for each of the regions holding the first num_regions voronoi points.
+    # The map is labelled once per distinct colour under those points rather than flood filling from each one.
+    bg = landscape.tiles["graphic"]["bg"]
+    regions_by_colour = dict()
+
+    dirt_patch_masks = list()
+    for i in range(0, num_regions):
+        x, y = vorgen.vor.filtered_points[i]
+        colour = tuple(bg[x, y].tolist())
+        if colour not in regions_by_colour:
+            regions_by_colour[colour] = Regions(colour_mask(bg, colour))
+
+        regions = regions_by_colour[colour]
+        dirt_patch_masks.append(regions.region_mask(regions.label_at(x, y)))
+
+    return dirt_patch_masks
+
+
+def fill_regions(landscape, region_masks, start_colour, end_colour, blend_colour, accent_colour, rng):
+    # Start colour, end colour - The range of color you want this tile to become
+    # Blend colour - the colour this section blends into, tiles on the edge of the section will completely fade into it
+    # accent colour - an extra dash for tiles that are completly surrounded by similar coloured tiles
+    if len(region_masks) == 0:
+        return
+
+    region_mask = np.logical_or.reduce(region_masks)
+    score = neighbour_count(region_mask)[region_mask]
+
+    bg = utils.color_array.lerp(blend_colour, start_colour, score / 8)
+    accented = score == 8
+    bg[accented] = utils.color_array.random_lerp(bg[accented], accent_colour, rng=rng)
+
+    graphic = landscape.tiles["graphic"]
+    graphic["bg"][region_mask] = bg
+
+    shaded_mask = region_mask.copy()
+    shaded_mask[region_mask] = rng.random(len(score)) < 0.5
+    graphic["ch"][shaded_mask] = 9617
+    graphic["fg"][shaded_mask] = utils.color_array.lerp(start_colour, end_colour, np.minimum(0.4, rng.random(np.count_nonzero(shaded_mask))))
+
+def add_smooth_noise_to_landscape(landscape, noise, scale, start_colour, end_colour, origin=(0, 0)):
+    # Create an open multi-dimensional mesh-grid.
+    ogrid = [np.arange(origin[0], origin[0] + landscape.width, dtype=np.float32),
+            np.arange(origin[1], origin[1] + landscape.height, dtype=np.float32)]
+
+    ogrid[0] *= scale
+    ogrid[1] *= scale
+
+    # Return the sampled noise from this grid of points.
+    samples = noise.sample_ogrid(ogrid)
+
+    bg = landscape.tiles["graphic"]["bg"]
+    utils.color_array.lerp(bg, end_colour, samples / 1.2, out=bg)
+
+
+def add_noise_to_landscape(landscape, noise, threshold, start_colour, end_colour, rng, origin=(0, 0)):
+    # Create an open multi-dimensional mesh-grid.
+    ogrid = [np.arange(origin[0], origin[0] + landscape.width, dtype=np.float32),
+            np.arange(origin[1], origin[1] + landscape.height, dtype=np.float32)]
+
+    # Return the sampled noise from this grid of points.
+    samples = noise.sample_ogrid(ogrid)
+
+    mask = samples > threshold
+    count = np.count_nonzero(mask)
+
+    colour = utils.color_array.lerp(start_colour, end_colour, np.maximum(0.5, rng.random(count)))
+    graphic = landscape.tiles["graphic"]
+    graphic["ch"][mask] = 9617
+    graphic["bg"][mask] = colour
+    graphic["fg"][mask] = utils.color_array.lerp(colour, utils.color.DARK_GREEN, np.maximum(0.8, rng.random(count)))
+
+
+def save_original_color(landscape):
+    landscape.tiles["original_bg"] = landscape.tiles["graphic"]["bg"]
+
+def add_painted_tiles(landscape, rng, origin=(0, 0)):
+    count = 0
+    for y in range(0,2):
+        for x in range(0,2):
+            grid_x = x * painted_grid_width - origin[0]
+            grid_y = y * painted_grid_height - origin[1]
+            if grid_overlaps_landscape(landscape, grid_x, grid_y) and os.path.isfile(get_app_path() + painted_grids[count]):
+                xp_data = xp_loader.load_xp_file(get_app_path() + painted_grids[count], layers={0, 1, 2})
+                paint_grid(landscape, xp_data, grid_x, grid_y, rng)
+            count += 1
+
+def grid_overlaps_landscape(landscape, x, y):
+    return x < landscape.width and y < landscape.height and x + painted_grid_width > 0 and y + painted_grid_height > 0
+
+def paint_grid(landscape, xp_data, x, y, rng):
+    # Layer 0 is drawn straight onto the map, layer 1 holds artefacts and layer 2 holds paint_rules markers
+    # x, y is where the grid's top left goes in the landscape, anything hanging off the landscape is clipped
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + painted_grid_width, landscape.width), min(y + painted_grid_height, landscape.height)
+    grid_slice = (slice(x0 - x, x1 - x), slice(y0 - y, y1 - y))
+
+    tiles = landscape.tiles[x0:x1, y0:y1]
+    artefact_tiles = landscape.artefact_tiles[x0:x1, y0:y1]
+    graphic = xp_data['layer_data'][0]['graphic'][grid_slice]
+    artefacts = xp_data['layer_data'][1]['graphic']['ch'][grid_slice]
+    markers = xp_data['layer_data'][2]['graphic']['ch'][grid_slice]
+
+    painted = graphic['ch'] != ord(" ")
+    tiles['graphic'][painted] = graphic[painted]
+
+    placed = artefacts != ord(" ")
+    artefact_tiles[placed] = artefacts[placed]
+
+    for marker, rule in paint_rules.items():
+        mask = markers == marker
+        count = np.count_nonzero(mask)
+        if count == 0:
+            continue
+
+        if rule.walkable is not None:
+            tiles['walkable'][mask] = rule.walkable
+        if rule.ch is not None:
+            tiles['graphic']['ch'][mask] = rule.ch
+        if rule.fg_range is not None:
+            tiles['graphic']['fg'][mask] = utils.color_array.random_lerp(rule.fg_range[0], rule.fg_range[1], count, rng=rng)
+        if rule.bg_range is not None:
+            tiles['graphic']['bg'][mask] = utils.color_array.random_lerp(rule.bg_range[0], rule.bg_range[1], count, rng=rng)
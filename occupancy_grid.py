@@ -0,0 +1,84 @@
+from typing import Tuple
+
+import numpy as np
+
+##################################
+# How many entities are on each tile of a section and whether any of them block movement, as arrays.
+# The owning section keeps it current as entities are added, removed, moved or stop blocking, so a question like
+# "can anything walk here" is tiles["walkable"] & ~blocked and "is this 3x3 area empty" is a reduction over counts.
+# Entities off the edge of the section are remembered but not counted.
+# The arrays always cover the whole section, chunked tiles (see ChunkedTiles) included, at 9 bytes a tile.
+##################################
+
+
+class OccupancyGrid:
+    def __init__(self, width: int, height: int) -> None:
+        self.width, self.height = width, height
+        self.counts = np.zeros((width, height), dtype=np.int32, order="F")
+        self.blocking_counts = np.zeros((width, height), dtype=np.int32, order="F")
+        self.blocked = np.zeros((width, height), dtype=bool, order="F")
+
+        # entity -> the (x, y, blocks_movement) it was counted with, so it can be taken off again after it's changed
+        self.counted = {}
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def add(self, entity):
+        x, y, blocks = entity.x, entity.y, bool(entity.blocks_movement)
+        self.counted[entity] = (x, y, blocks)
+        if not self.in_bounds(x, y):
+            return
+
+        self.counts[x, y] += 1
+        if blocks:
+            self.blocking_counts[x, y] += 1
+            self.blocked[x, y] = True
+
+    def add_many(self, entities, xs, ys, blocks):
+        """ add for a list of entities whose positions and blocks_movement are already known, as lists """
+        for entity, x, y, entity_blocks in zip(entities, xs, ys, blocks):
+            self.counted[entity] = (x, y, entity_blocks)
+
+        xs, ys, blocks = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64), np.asarray(blocks, dtype=bool)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        np.add.at(self.counts, (xs[inside], ys[inside]), 1)
+
+        blocking = inside & blocks
+        np.add.at(self.blocking_counts, (xs[blocking], ys[blocking]), 1)
+        self.blocked[xs[blocking], ys[blocking]] = True
+
+    def remove(self, entity):
+        counted = self.counted.pop(entity, None)
+        if counted is None:
+            return
+
+        x, y, blocks = counted
+        if not self.in_bounds(x, y):
+            return
+
+        self.counts[x, y] -= 1
+        if blocks:
+            self.blocking_counts[x, y] -= 1
+            self.blocked[x, y] = self.blocking_counts[x, y] > 0
+
+    def update(self, entity):
+        """ Call when an entity has moved or changed whether it blocks movement """
+        if self.counted.get(entity) == (entity.x, entity.y, bool(entity.blocks_movement)):
+            return
+
+        self.remove(entity)
+        self.add(entity)
+
+    def is_blocked(self, x: int, y: int) -> bool:
+        return self.in_bounds(x, y) and bool(self.blocked[x, y])
+
+    def area(self, x: int, y: int, width: int, height: int) -> Tuple[slice, slice]:
+        """ The part of the rectangle that's on the grid, ready to index the arrays with """
+        return slice(max(0, x), max(0, min(self.width, x + width))), slice(max(0, y), max(0, min(self.height, y + height)))
+
+    def is_area_empty(self, x: int, y: int, width: int = 1, height: int = 1) -> bool:
+        return not self.counts[self.area(x, y, width, height)].any()
+
+    def is_area_unblocked(self, x: int, y: int, width: int = 1, height: int = 1) -> bool:
+        return not self.blocked[self.area(x, y, width, height)].any()
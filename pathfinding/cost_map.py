@@ -0,0 +1,136 @@
+import numpy as np
+import tcod.path
+
+from entities.entity import Actor, Prop
+
+# What an entity blocking a walkable tile adds to its cost.
+# A lower number means more enemies will crowd behind each other in hallways.
+# A higher number means enemies will take longer paths in order to surround the player.
+actor_cost = 10
+prop_cost = 1000
+
+
+def base_cost(tiles) -> np.ndarray:
+    """ The cost of walking onto each tile before any entities are counted, 0 for tiles that can't be walked on.
+    Only the fields it needs are read, reading from a ChunkedView copies out the whole map. """
+    cost = np.asarray(tiles["cost"]).astype(np.int32)
+    cost += 1
+    cost[~np.asarray(tiles["walkable"])] = 0
+    return cost
+
+def entity_cost(entity) -> int:
+    if not entity.blocks_movement:
+        return 0
+    if isinstance(entity, Actor):
+        return actor_cost
+    if isinstance(entity, Prop):
+        return prop_cost
+    return 0
+
+def is_static(entity) -> bool:
+    """ Whether the entity stays where it's put, rather than moving around every turn """
+    return isinstance(entity, Prop)
+
+
+class CostMap:
+    """ Pathfinding cost of every tile in a section: the terrain's cost with whatever entities add on top of it.
+    Terrain is only re-read where tiles change and an entity is only re-counted when it moves, spawns, despawns or changes,
+    so keeping the map current costs time in proportion to what changed rather than to the size of the map.
+    graph reads cost in place, so the same graph stays valid for as long as the map does.
+    static_cost is the same without the entities that move around (actors), for whatever would rather not change every turn.
+    listener(x0, y0, x1, y1) is called for every listener with the area (end exclusive) whose cost just changed,
+    for every static listener when static_cost changed there, and for every terrain listener when the terrain (base) did.
+    The arrays are always the size of the whole map, even over a ChunkedView, at a few bytes a tile rather than a whole tile_dt. """
+    def __init__(self, tiles):
+        self.width, self.height = tiles.shape
+        self.listeners = []
+        self.static_listeners = []
+        self.terrain_listeners = []
+
+        self.base = np.asfortranarray(base_cost(tiles))
+        self.entity_overlay = np.zeros(tiles.shape, dtype=np.int32, order="F")
+        self.static_overlay = np.zeros(tiles.shape, dtype=np.int32, order="F")
+        self.entity_costs = {}
+
+        self.cost = np.zeros(tiles.shape, dtype=np.int32, order="F")
+        self.static_cost = np.zeros(tiles.shape, dtype=np.int32, order="F")
+        self.refresh(0, 0, self.width, self.height, static=True)
+        self.graph = tcod.path.SimpleGraph(cost=self.cost, cardinal=2, diagonal=3)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def update_tiles(self, x: int, y: int, tiles):
+        """ Re-read the terrain cost of a block of tiles whose top left is at x, y """
+        width, height = tiles.shape[:2]
+        self.base[x:x + width, y:y + height] = base_cost(tiles)
+        self.refresh(x, y, x + width, y + height, static=True)
+
+        for listener in self.terrain_listeners:
+            listener(x, y, x + width, y + height)
+
+    def counted_cost(self, entity):
+        """ What the entity adds where it is now, and whether that goes into static_cost """
+        if not self.in_bounds(entity.x, entity.y):
+            return 0, False
+        return entity_cost(entity), is_static(entity)
+
+    def add_entity(self, entity):
+        cost, static = self.counted_cost(entity)
+        self.entity_costs[entity] = (entity.x, entity.y, cost, static)
+        if cost:
+            self.entity_overlay[entity.x, entity.y] += cost
+            if static:
+                self.static_overlay[entity.x, entity.y] += cost
+            self.refresh(entity.x, entity.y, entity.x + 1, entity.y + 1, static)
+
+    def add_entities(self, entities, xs, ys):
+        """ add_entity for a list of entities whose positions are already known, with a single refresh at the end """
+        costs, statics = [], []
+        for entity, x, y in zip(entities, xs, ys):
+            cost, static = (entity_cost(entity), is_static(entity)) if self.in_bounds(x, y) else (0, False)
+            self.entity_costs[entity] = (x, y, cost, static)
+            costs.append(cost)
+            statics.append(static)
+
+        xs, ys, costs = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64), np.asarray(costs, dtype=np.int32)
+        statics = np.asarray(statics, dtype=bool)
+        counted = costs != 0
+        if counted.any():
+            np.add.at(self.entity_overlay, (xs[counted], ys[counted]), costs[counted])
+            counted_static = counted & statics
+            np.add.at(self.static_overlay, (xs[counted_static], ys[counted_static]), costs[counted_static])
+
+            xs, ys = xs[counted], ys[counted]
+            self.refresh(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1, bool(counted_static.any()))
+
+    def remove_entity(self, entity):
+        x, y, cost, static = self.entity_costs.pop(entity, (0, 0, 0, False))
+        if cost:
+            self.entity_overlay[x, y] -= cost
+            if static:
+                self.static_overlay[x, y] -= cost
+            self.refresh(x, y, x + 1, y + 1, static)
+
+    def update_entity(self, entity):
+        """ Call when an entity has moved or something that affects its cost has changed """
+        counted = self.entity_costs.get(entity)
+        if counted is not None and counted == (entity.x, entity.y, *self.counted_cost(entity)):
+            return
+
+        self.remove_entity(entity)
+        self.add_entity(entity)
+
+    def refresh(self, x0: int, y0: int, x1: int, y1: int, static: bool = False):
+        """ Recount cost over an area, and static_cost too if static entities or the terrain changed there """
+        area = (slice(x0, x1), slice(y0, y1))
+        base = self.base[area]
+        self.cost[area] = np.where(base > 0, base + self.entity_overlay[area], 0)
+        if static:
+            self.static_cost[area] = np.where(base > 0, base + self.static_overlay[area], 0)
+
+        for listener in self.listeners:
+            listener(x0, y0, x1, y1)
+        if static:
+            for listener in self.static_listeners:
+                listener(x0, y0, x1, y1)
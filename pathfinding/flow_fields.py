@@ -0,0 +1,115 @@
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import tcod.path
+
+from pathfinding.cost_map import CostMap
+
+##################################
+# Shared distance maps for goals that lots of actors head towards, e.g. the player, doors or a crop field.
+# Each named goal gets one Dijkstra map over the cost map, filled out from every tile of the goal at once,
+# and any number of actors can then read their next step towards it with a single array lookup.
+# A goal only covers its area (the whole map by default) and its map is only recomputed, the next time it's read,
+# once the cost map has changed somewhere inside that area.
+##################################
+
+
+class FlowField:
+    def __init__(self, cost_map: CostMap, points, area):
+        self.points = points
+        self.area = area
+
+        # A view of the cost map, so the graph sees cost changes without being rebuilt
+        x0, y0, x1, y1 = area
+        self.graph = tcod.path.SimpleGraph(cost=cost_map.cost[x0:x1, y0:y1], cardinal=2, diagonal=3)
+        self.distance = None
+        self.traversal = None
+        self.unreachable = None
+        self.dirty = True
+
+    def compute(self):
+        x0, y0, x1, y1 = self.area
+        pathfinder = tcod.path.Pathfinder(self.graph)
+        for x, y in self.points:
+            if x0 <= x < x1 and y0 <= y < y1:
+                pathfinder.add_root((x - x0, y - y0))
+        pathfinder.resolve()
+
+        # traversal[x, y] is the next tile on the way to the nearest goal tile, in area coordinates
+        self.distance = pathfinder.distance
+        self.traversal = pathfinder.traversal
+        self.unreachable = np.iinfo(self.distance.dtype).max
+        self.dirty = False
+
+    def contains(self, x: int, y: int) -> bool:
+        x0, y0, x1, y1 = self.area
+        return x0 <= x < x1 and y0 <= y < y1
+
+    def overlaps(self, x0: int, y0: int, x1: int, y1: int) -> bool:
+        return x0 < self.area[2] and self.area[0] < x1 and y0 < self.area[3] and self.area[1] < y1
+
+
+class FlowFields:
+    def __init__(self, cost_map: CostMap):
+        self.cost_map = cost_map
+        self.goals = {}
+        cost_map.listeners.append(self.cost_changed)
+
+    def set_goal(self, name: str, points: Iterable[Tuple[int, int]], area: Optional[Tuple[int, int, int, int]] = None):
+        """ points are the goal's tiles, area is (x0, y0, x1, y1) (end exclusive) to limit its map to, clipped to the cost map """
+        points = tuple((int(x), int(y)) for x, y in points)
+        if area is None:
+            area = (0, 0, self.cost_map.width, self.cost_map.height)
+        else:
+            area = (max(0, area[0]), max(0, area[1]), min(self.cost_map.width, area[2]), min(self.cost_map.height, area[3]))
+
+        field = self.goals.get(name)
+        if field is not None and field.area == area:
+            if field.points != points:
+                field.points = points
+                field.dirty = True
+            return
+
+        self.goals[name] = FlowField(self.cost_map, points, area)
+
+    def remove_goal(self, name: str):
+        self.goals.pop(name, None)
+
+    def has_goal(self, name: str) -> bool:
+        return name in self.goals
+
+    def field(self, name: str) -> FlowField:
+        field = self.goals[name]
+        if field.dirty:
+            field.compute()
+        return field
+
+    def distance(self, name: str, x: int, y: int) -> Optional[int]:
+        """ Cost of the cheapest route from x, y to the goal, None if there isn't one """
+        field = self.field(name)
+        if not field.contains(x, y):
+            return None
+
+        distance = field.distance[x - field.area[0], y - field.area[1]]
+        if distance == field.unreachable:
+            return None
+        return int(distance)
+
+    def next_step(self, name: str, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """ The tile to move to from x, y to get closer to the goal, None if x, y is on the goal or can't reach it """
+        field = self.field(name)
+        if not field.contains(x, y):
+            return None
+
+        local_x, local_y = x - field.area[0], y - field.area[1]
+        distance = field.distance[local_x, local_y]
+        if distance == 0 or distance == field.unreachable:
+            return None
+
+        next_x, next_y = field.traversal[local_x, local_y]
+        return int(next_x) + field.area[0], int(next_y) + field.area[1]
+
+    def cost_changed(self, x0: int, y0: int, x1: int, y1: int):
+        for field in self.goals.values():
+            if not field.dirty and field.overlaps(x0, y0, x1, y1):
+                field.dirty = True
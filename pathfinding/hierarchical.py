@@ -0,0 +1,402 @@
+import heapq
+import itertools
+from typing import List, Tuple
+
+import numpy as np
+import tcod.path
+
+from pathfinding.cost_map import CostMap
+
+##################################
+# Hierarchical pathfinding (HPA*) over a cost map.
+# The map is split into square clusters. Wherever two neighbouring clusters can be walked between, their shared border
+# gets an entrance: a node on each side, linked by the single step across. Inside a cluster every pair of its nodes
+# is linked by the cheapest route between them that stays in the cluster, found once with a Dijkstra fill per node.
+# A query searches that small graph of entrances rather than the map, then fills in the tile by tile route from the
+# Dijkstra fills it already has, so its cost follows the number of clusters crossed rather than the size of the map.
+# The entrance graph is built from the cost map's static cost, the terrain and the props on it, so actors moving around
+# never rebuild it. They're accounted for on top instead: stepping onto an entrance pays for whoever is standing on it,
+# the start is searched from over the full cost, and any leg of the route that walks over an entity is searched again
+# over the full cost of its cluster.
+# When the terrain changes only the clusters it changed in are rebuilt, along with the borders they share with their
+# neighbours (and a neighbour too if its entrances moved), and that happens before the next path is found.
+# Props can't move entrances, which only depend on the terrain, so a cluster whose props changed is only stale: its
+# links cost what they used to until it's rebuilt, and queries don't wait for that.
+# Rebuilding is done a cluster at a time by rebuild_next(), so it can be spread over frames (see PathRequestQueue).
+# Borders are only crossed orthogonally, so a route that can only get between two clusters by squeezing diagonally
+# between two corners won't be found.
+##################################
+
+cardinal_cost = 2
+diagonal_cost = 3
+
+# Runs of open border at least this long get an entrance at each end rather than one in the middle
+wide_entrance = 6
+
+start_node = -1
+goal_node = -2
+
+
+class HierarchicalPathfinder:
+    def __init__(self, cost_map: CostMap, cluster_size: int = 16):
+        self.cost_map = cost_map
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-cost_map.width // cluster_size)
+        self.clusters_y = -(-cost_map.height // cluster_size)
+
+        self.next_node_id = itertools.count()
+        self.node_position = {}
+        self.node_cluster = {}
+        self.node_borders = {}
+        self.nodes_at = {}
+        self.node_distance = {}
+        self.node_traversal = {}
+        self.edges = {}
+        # node -> what stepping onto it costs on top of the static cost, for entrances an actor is standing on
+        self.node_penalty = {}
+
+        self.cluster_nodes = {cluster: set() for cluster in self.all_clusters()}
+        self.cluster_graphs = {}
+        self.cluster_cost_graphs = {}
+        self.border_links = {}
+
+        # Everything starts out dirty, so the graph is built by the first query
+        self.dirty_clusters = set(self.all_clusters())
+        self.stale_clusters = set()
+        cost_map.terrain_listeners.append(self.terrain_changed)
+        cost_map.static_listeners.append(self.static_changed)
+        cost_map.listeners.append(self.entities_changed)
+
+    def all_clusters(self):
+        return itertools.product(range(self.clusters_x), range(self.clusters_y))
+
+    def cluster_of(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.cluster_size, y // self.cluster_size
+
+    def cluster_bounds(self, cluster) -> Tuple[int, int, int, int]:
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return x0, y0, min(x0 + self.cluster_size, self.cost_map.width), min(y0 + self.cluster_size, self.cost_map.height)
+
+    def cluster_neighbours(self, cluster):
+        cx, cy = cluster
+        for neighbour in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+            if 0 <= neighbour[0] < self.clusters_x and 0 <= neighbour[1] < self.clusters_y:
+                yield neighbour
+
+    def cluster_graph(self, cluster):
+        """ The cluster's static cost, what the entrance graph is built from """
+        # A view of the cost map, so the graph stays current without being rebuilt
+        if cluster not in self.cluster_graphs:
+            x0, y0, x1, y1 = self.cluster_bounds(cluster)
+            self.cluster_graphs[cluster] = tcod.path.SimpleGraph(cost=self.cost_map.static_cost[x0:x1, y0:y1], cardinal=cardinal_cost, diagonal=diagonal_cost)
+        return self.cluster_graphs[cluster]
+
+    def cluster_cost_graph(self, cluster):
+        """ The cluster's full cost, entities included, what routes are filled in over """
+        if cluster not in self.cluster_cost_graphs:
+            x0, y0, x1, y1 = self.cluster_bounds(cluster)
+            self.cluster_cost_graphs[cluster] = tcod.path.SimpleGraph(cost=self.cost_map.cost[x0:x1, y0:y1], cardinal=cardinal_cost, diagonal=diagonal_cost)
+        return self.cluster_cost_graphs[cluster]
+
+    def clusters_in(self, x0: int, y0: int, x1: int, y1: int):
+        return itertools.product(range(x0 // self.cluster_size, (x1 - 1) // self.cluster_size + 1), range(y0 // self.cluster_size, (y1 - 1) // self.cluster_size + 1))
+
+    def terrain_changed(self, x0: int, y0: int, x1: int, y1: int):
+        self.dirty_clusters.update(self.clusters_in(x0, y0, x1, y1))
+
+    def static_changed(self, x0: int, y0: int, x1: int, y1: int):
+        self.stale_clusters.update(cluster for cluster in self.clusters_in(x0, y0, x1, y1) if cluster not in self.dirty_clusters)
+
+    def entities_changed(self, x0: int, y0: int, x1: int, y1: int):
+        if (x1 - x0) * (y1 - y0) <= len(self.nodes_at):
+            positions = [(x, y) for x in range(x0, x1) for y in range(y0, y1) if (x, y) in self.nodes_at]
+        else:
+            positions = [position for position in self.nodes_at if x0 <= position[0] < x1 and y0 <= position[1] < y1]
+
+        for position in positions:
+            self.update_penalty(self.nodes_at[position])
+
+    def update_penalty(self, node):
+        position = self.node_position[node]
+        penalty = int(self.cost_map.entity_overlay[position] - self.cost_map.static_overlay[position]) * cardinal_cost
+        if penalty:
+            self.node_penalty[node] = penalty
+        else:
+            self.node_penalty.pop(node, None)
+
+    ##################################
+    # Building the graph
+    ##################################
+
+    def update(self, stale: bool = True):
+        """ Rebuild whatever the terrain has changed since the last update, and the stale clusters too unless told not to """
+        while self.rebuild_next(stale):
+            pass
+
+    def rebuild_next(self, stale: bool = True) -> bool:
+        """ Rebuild one dirty cluster, or one stale cluster if there are none and stale is set.
+        Returns False if there was nothing to do. """
+        if self.dirty_clusters:
+            cluster = self.dirty_clusters.pop()
+            self.stale_clusters.discard(cluster)
+        elif stale and self.stale_clusters:
+            cluster = self.stale_clusters.pop()
+        else:
+            return False
+
+        for neighbour in self.cluster_neighbours(cluster):
+            if self.rebuild_border((min(cluster, neighbour), max(cluster, neighbour))):
+                # The neighbour's nodes have changed too, its links inside it have to be worked out again
+                self.dirty_clusters.add(neighbour)
+                self.stale_clusters.discard(neighbour)
+        self.rebuild_cluster(cluster)
+        return True
+
+    def rebuild_border(self, border) -> bool:
+        """ Returns True if the border's entrances have moved, rather than just their costs changing """
+        # Where the entrances go only depends on the terrain, what it costs to cross them includes the props
+        base, cost = self.cost_map.base, self.cost_map.static_cost
+        a_cluster, b_cluster = border
+        x0, y0, x1, y1 = self.cluster_bounds(a_cluster)
+        if b_cluster[0] != a_cluster[0]:
+            # b is to the right of a
+            open_tiles = (base[x1 - 1, y0:y1] > 0) & (base[x1, y0:y1] > 0)
+            pairs = [((x1 - 1, y0 + i), (x1, y0 + i)) for i in entrance_offsets(open_tiles)]
+        else:
+            # b is below a
+            open_tiles = (base[x0:x1, y1 - 1] > 0) & (base[x0:x1, y1] > 0)
+            pairs = [((x0 + i, y1 - 1), (x0 + i, y1)) for i in entrance_offsets(open_tiles)]
+
+        links = self.border_links.get(border, [])
+        if pairs == [(self.node_position[a], self.node_position[b]) for a, b in links]:
+            for a, b in links:
+                self.edges[a][b] = int(cost[self.node_position[b]]) * cardinal_cost
+                self.edges[b][a] = int(cost[self.node_position[a]]) * cardinal_cost
+            return False
+
+        for a, b in self.border_links.pop(border, ()):
+            self.edges[a].pop(b, None)
+            self.edges[b].pop(a, None)
+            self.release_node(a, border)
+            self.release_node(b, border)
+
+        links = []
+        for a_position, b_position in pairs:
+            a = self.acquire_node(a_position, a_cluster, border)
+            b = self.acquire_node(b_position, b_cluster, border)
+            self.edges[a][b] = int(cost[b_position]) * cardinal_cost
+            self.edges[b][a] = int(cost[a_position]) * cardinal_cost
+            links.append((a, b))
+
+        self.border_links[border] = links
+        return True
+
+    def acquire_node(self, position, cluster, border) -> int:
+        node = self.nodes_at.get(position)
+        if node is None:
+            node = next(self.next_node_id)
+            self.nodes_at[position] = node
+            self.node_position[node] = position
+            self.node_cluster[node] = cluster
+            self.node_borders[node] = set()
+            self.edges[node] = {}
+            self.cluster_nodes[cluster].add(node)
+            self.update_penalty(node)
+
+        self.node_borders[node].add(border)
+        return node
+
+    def release_node(self, node, border):
+        # A node in a corner of a cluster can be an entrance on two borders, it goes once neither border needs it
+        borders = self.node_borders.get(node)
+        if borders is None:
+            return
+
+        borders.discard(border)
+        if not borders:
+            self.cluster_nodes[self.node_cluster[node]].discard(node)
+            del self.nodes_at[self.node_position[node]]
+            del self.node_position[node], self.node_cluster[node], self.node_borders[node], self.edges[node]
+            self.node_distance.pop(node, None)
+            self.node_traversal.pop(node, None)
+            self.node_penalty.pop(node, None)
+
+    def rebuild_cluster(self, cluster):
+        x0, y0, x1, y1 = self.cluster_bounds(cluster)
+        graph = self.cluster_graph(cluster)
+        nodes = self.cluster_nodes[cluster]
+
+        # Keep only the links out of the cluster, the ones inside it are worked out again below
+        for node in nodes:
+            self.edges[node] = {other: cost for other, cost in self.edges[node].items() if other in self.node_cluster and self.node_cluster[other] != cluster}
+
+        for node in nodes:
+            x, y = self.node_position[node]
+            pathfinder = tcod.path.Pathfinder(graph)
+            pathfinder.add_root((x - x0, y - y0))
+            pathfinder.resolve()
+
+            distance = pathfinder.distance
+            unreachable = np.iinfo(distance.dtype).max
+            self.node_distance[node] = distance
+            # One flat list rather than a list per tile, a few hundred thousand little lists slow down every garbage collection
+            self.node_traversal[node] = pathfinder.traversal.ravel().tolist()
+
+            for other in nodes:
+                if other != node:
+                    other_x, other_y = self.node_position[other]
+                    other_distance = distance[other_x - x0, other_y - y0]
+                    if other_distance != unreachable:
+                        self.edges[node][other] = int(other_distance)
+
+    ##################################
+    # Queries
+    ##################################
+
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """ The tiles to walk through to get from start to goal, not including start, empty if goal can't be reached """
+        # Through a PathRequestQueue this has already been done, a cluster at a time
+        self.update(stale=False)
+
+        start, goal = (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
+        width, height = self.cost_map.width, self.cost_map.height
+        if start == goal or not (0 <= start[0] < width and 0 <= start[1] < height and 0 <= goal[0] < width and 0 <= goal[1] < height):
+            return []
+        if self.cost_map.cost[goal] == 0:
+            return []
+
+        start_cluster, goal_cluster = self.cluster_of(*start), self.cluster_of(*goal)
+        start_x0, start_y0 = self.cluster_bounds(start_cluster)[:2]
+        goal_x0, goal_y0 = self.cluster_bounds(goal_cluster)[:2]
+        goal_local = (goal[0] - goal_x0, goal[1] - goal_y0)
+
+        # Fill out from start across its own cluster, that gives the links from start to the cluster's entrances
+        start_search = tcod.path.Pathfinder(self.cluster_cost_graph(start_cluster))
+        start_search.add_root((start[0] - start_x0, start[1] - start_y0))
+        start_search.resolve()
+        start_distance = start_search.distance
+        unreachable = np.iinfo(start_distance.dtype).max
+
+        start_links = {}
+        for node in self.cluster_nodes[start_cluster]:
+            x, y = self.node_position[node]
+            distance = start_distance[x - start_x0, y - start_y0]
+            if distance != unreachable:
+                start_links[node] = int(distance)
+
+        goal_links = {}
+        for node in self.cluster_nodes[goal_cluster]:
+            distance = self.node_distance[node][goal_local]
+            if distance != unreachable:
+                goal_links[node] = int(distance)
+
+        if start_cluster == goal_cluster and start_distance[goal_local] != unreachable:
+            start_links[goal_node] = int(start_distance[goal_local])
+
+        came_from = self.search(start, goal, start_links, goal_links)
+        if came_from is None:
+            return []
+
+        route = [goal_node]
+        while route[-1] != start_node:
+            route.append(came_from[route[-1]])
+        route.reverse()
+
+        start_traversal = None
+        path = []
+        for a, b in zip(route, route[1:]):
+            if a == start_node:
+                if start_traversal is None:
+                    start_traversal = start_search.traversal.ravel().tolist()
+                target = goal if b == goal_node else self.node_position[b]
+                path.extend(walk_traversal(start_traversal, start_distance.shape[1], (start_x0, start_y0), target))
+            elif b == goal_node:
+                path.extend(self.refine(a, goal))
+            elif self.node_cluster[a] == self.node_cluster[b]:
+                path.extend(self.refine(a, self.node_position[b]))
+            else:
+                path.append(self.node_position[b])
+
+        return path
+
+    def refine(self, node, target) -> List[Tuple[int, int]]:
+        """ The route from node to target inside node's cluster. The route from the node's Dijkstra fill if no entity
+        is standing on it, otherwise the cheapest route over the cluster's full cost. """
+        cluster = self.node_cluster[node]
+        x0, y0, _, y1 = self.cluster_bounds(cluster)
+        steps = walk_traversal(self.node_traversal[node], y1 - y0, (x0, y0), target)
+        if not steps:
+            return steps
+
+        xs, ys = zip(*steps)
+        if not self.cost_map.entity_overlay[xs, ys].any():
+            return steps
+
+        x, y = self.node_position[node]
+        search = tcod.path.Pathfinder(self.cluster_cost_graph(cluster))
+        search.add_root((x - x0, y - y0))
+        return [(step_x + x0, step_y + y0) for step_x, step_y in search.path_to((target[0] - x0, target[1] - y0))[1:].tolist()]
+
+    def search(self, start, goal, start_links, goal_links):
+        """ A* over the entrance graph, returns each node's predecessor on the way to the goal or None if there's no way.
+        The graph's links don't know about actors, so stepping onto an entrance also pays for whoever is standing on it now. """
+        node_penalty = self.node_penalty
+
+        def estimate(position):
+            dx, dy = abs(position[0] - goal[0]), abs(position[1] - goal[1])
+            return cardinal_cost * max(dx, dy) + (diagonal_cost - cardinal_cost) * min(dx, dy)
+
+        best = {start_node: 0}
+        came_from = {}
+        open_nodes = [(estimate(start), 0, start_node)]
+        while open_nodes:
+            _, cost, node = heapq.heappop(open_nodes)
+            if node == goal_node:
+                return came_from
+            if cost > best[node]:
+                continue
+
+            if node == start_node:
+                links = start_links.items()
+            elif node in goal_links:
+                links = itertools.chain(self.edges[node].items(), ((goal_node, goal_links[node]),))
+            else:
+                links = self.edges[node].items()
+
+            for other, step in links:
+                other_cost = cost + step
+                if other in node_penalty:
+                    other_cost += node_penalty[other]
+                if other_cost < best.get(other, other_cost + 1):
+                    best[other] = other_cost
+                    came_from[other] = node
+                    heapq.heappush(open_nodes, (other_cost + (0 if other == goal_node else estimate(self.node_position[other])), other_cost, other))
+
+        return None
+
+
+def entrance_offsets(open_tiles):
+    """ Where along a border to put entrances, given which tiles of it can be crossed """
+    changes = np.flatnonzero(np.diff(np.concatenate(([0], open_tiles.astype(np.int8), [0]))))
+    for start, end in zip(changes[0::2].tolist(), changes[1::2].tolist()):
+        if end - start < wide_entrance:
+            yield (start + end - 1) // 2
+        else:
+            yield start
+            yield end - 1
+
+def walk_traversal(traversal, height, origin, target):
+    """ The route from a Dijkstra fill's root to target (root not included),
+    traversal being the fill's traversal flattened to a list and height the height of the area it covers """
+    x, y = target[0] - origin[0], target[1] - origin[1]
+    steps = []
+    while True:
+        i = (x * height + y) * 2
+        previous_x, previous_y = traversal[i], traversal[i + 1]
+        if previous_x == x and previous_y == y:
+            break
+        steps.append((x + origin[0], y + origin[1]))
+        x, y = previous_x, previous_y
+
+    steps.reverse()
+    return steps
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Tuple
+
+##################################
+# Path queries that are answered a few at a time rather than all at once.
+# request() hands back a Future straight away and service() works through the queue, oldest first, until its
+# per frame time budget is spent, so lots of actors re-pathing on the same frame spreads over the next few frames
+# instead of causing one long one. Asking for the same start and goal as a request still waiting gets the same Future.
+# Results are delivered on whichever thread calls service(), which for a section is the main thread during update,
+# so done callbacks can touch the section freely and everything serviced is ready before late_update.
+# Keeping the search graph up to date comes out of the same budget, a unit of work at a time: whatever has to be
+# rebuilt before a path can be found is done before any request is answered, and what can wait gets what's left.
+# The deadline is checked before each unit of work, so a frame only goes over its budget by the last unit started.
+##################################
+
+
+class PathRequestQueue:
+    def __init__(self, find_path: Callable, budget_ms: float = 2.0, rebuild_next: Callable = None, clock: Callable = time.perf_counter):
+        """ find_path(start, goal) does the actual search.
+        rebuild_next(stale) does one unit of work on the search graph and returns False if there was none to do,
+        with stale False it only does what has to be done before find_path can be called.
+        clock() is the time in seconds the budget is measured with. """
+        self.find_path = find_path
+        self.rebuild_next = rebuild_next
+        self.budget_ms = budget_ms
+        self.clock = clock
+        self.pending = OrderedDict()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def request(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Future:
+        """ future.result() is the path once future.done(), cancel it if the path isn't wanted any more """
+        key = ((int(start[0]), int(start[1])), (int(goal[0]), int(goal[1])))
+        future = self.pending.get(key)
+        if future is None or future.cancelled():
+            future = Future()
+            self.pending[key] = future
+
+        return future
+
+    def service(self, budget_ms: float = None):
+        """ Rebuild and answer waiting requests until the budget is spent.
+        At least one unit of work is always done so the queue keeps moving. """
+        if budget_ms is None:
+            budget_ms = self.budget_ms
+
+        deadline = self.clock() + budget_ms / 1000
+        worked = False
+
+        def out_of_time() -> bool:
+            return worked and self.clock() >= deadline
+
+        if self.rebuild_next is not None:
+            while True:
+                if out_of_time():
+                    # Requests wait for the rest of the rebuild next frame
+                    return
+                if not self.rebuild_next(False):
+                    break
+                worked = True
+
+        while self.pending:
+            if out_of_time():
+                return
+
+            (start, goal), future = self.pending.popitem(last=False)
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(self.find_path(start, goal))
+            except Exception as e:
+                future.set_exception(e)
+            worked = True
+
+        if self.rebuild_next is not None:
+            while not out_of_time() and self.rebuild_next(True):
+                worked = True
@@ -0,0 +1,37 @@
+from entities.render_order import RenderOrder
+
+##################################
+# A section's entities grouped by render order, so drawing them in order is a walk over the groups rather than a sort.
+# Each group is a dict used as an ordered set, entities within a group come out in the order they joined it.
+# The owning section moves an entity between groups when its render order changes (e.g. an actor dying).
+##################################
+
+
+class RenderBuckets:
+    def __init__(self) -> None:
+        self.buckets = {render_order: {} for render_order in sorted(RenderOrder, key=lambda render_order: render_order.value)}
+        self.bucket_of = {}
+
+    def __iter__(self):
+        """ Every entity, lowest render order first """
+        for bucket in self.buckets.values():
+            yield from bucket
+
+    def __len__(self):
+        return len(self.bucket_of)
+
+    def add(self, entity):
+        render_order = entity.render_order
+        self.buckets[render_order][entity] = None
+        self.bucket_of[entity] = render_order
+
+    def remove(self, entity):
+        render_order = self.bucket_of.pop(entity, None)
+        if render_order is not None:
+            del self.buckets[render_order][entity]
+
+    def update(self, entity):
+        """ Call when an entity's render order may have changed """
+        if self.bucket_of.get(entity) is not entity.render_order:
+            self.remove(entity)
+            self.add(entity)
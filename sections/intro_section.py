@@ -7,7 +7,7 @@ import tcod
 from actions.actions import IntroEndAction, PlayMusicFileAction, PlayMenuMusicAction
 from image import Image
 from tcod import Console
-import copy
+import utils.color_array
 
 from sections.section import Section
 
@@ -113,19 +113,21 @@ class IntroSection(Section):
                 elif self.time_into_splash > splash.outro_start:
                     t = self.translate(self.time_into_splash, splash.outro_start,  splash.outro_end, 0, 1)
 
-                for w in range(0, console.width):
-                    for h in range(0, self.height):
-                        new_tile =  copy.copy(splash.image.tiles[w,h]["graphic"])
-                        if self.time_into_splash < splash.intro:
-                            new_tile[1] = self.blend_colour(new_tile[1], (0,0,0), t)
-                            new_tile[2] = self.blend_colour(new_tile[2], (0,0,0), t)
-                        elif self.time_into_splash > splash.outro_start:
-                            new_tile[1] = self.blend_colour((0,0,0), new_tile[1],  t)
-                            new_tile[2] = self.blend_colour((0,0,0), new_tile[2],  t)
-
-                        console.tiles_rgb[w,h] = new_tile
+                new_tiles = splash.image.tiles["graphic"][0:console.width, 0:self.height].copy()
+                if self.time_into_splash < splash.intro:
+                    utils.color_array.blend(new_tiles["fg"], (0,0,0), t, out=new_tiles["fg"])
+                    utils.color_array.blend(new_tiles["bg"], (0,0,0), t, out=new_tiles["bg"])
+                elif self.time_into_splash > splash.outro_start:
+                    utils.color_array.blend((0,0,0), new_tiles["fg"], t, out=new_tiles["fg"])
+                    utils.color_array.blend((0,0,0), new_tiles["bg"], t, out=new_tiles["bg"])
+
+                console.tiles_rgb[0:new_tiles.shape[0], 0:new_tiles.shape[1]] = new_tiles
             elif splash.type == IntroSplashType.BLANK:
                 pass
+
+          loading_progress = self.engine.get_loading_progress()
+          if loading_progress < 1:
+            console.print(x=0, y=self.height - 1, string="Generating world... {}%".format(int(loading_progress * 100)), fg=(96, 96, 96))
             
     def keydown(self, key):
         if key == tcod.event.K_RETURN or key == tcod.event.K_ESCAPE:
@@ -148,8 +150,4 @@ class IntroSection(Section):
         return rightMin + (valueScaled * rightSpan)
 
     def blend_colour(self, lc, rc, t):
-        r = lc[0] * t + rc[0] * (1 - t) 
-        g = lc[1] * t + rc[1] * (1 - t) 
-        b = lc[2] * t + rc[2] * (1 - t)
-
-        return (int(r),int(g),int(b))
\ No newline at end of file
+        return tuple(utils.color_array.blend(lc, rc, t).tolist())
\ No newline at end of file
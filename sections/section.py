@@ -1,4 +1,3 @@
-import gzip
 import os
 import random
 from math import sqrt
@@ -7,14 +6,18 @@ from typing import Optional, Tuple
 import numpy as np
 import tile_types
 import xp_loader
+from occupancy_grid import OccupancyGrid
 from entities.entity import Entity
 from entities.entity_loader import EntityLoader
 from pygame import mixer, sndarray
+from render_buckets import RenderBuckets
+from spatial_index import SpatialIndex
+from terrain_layer import TerrainLayer
 from utils.utils import Neighbourhood
 
 
 class Section:
-    def __init__(self, engine, x: int, y: int, width: int, height: int, xp_filepath: str = ""):
+    def __init__(self, engine, x: int, y: int, width: int, height: int, xp_filepath: str = "", entity_store=None):
         self.engine = engine
 
         self.x = x
@@ -24,6 +27,15 @@ class Section:
         
         self.entity_loader = EntityLoader(self.engine)
         self.entities = []
+        # Sections that want their entities' attributes in arrays pass in an EntityStore, it has to be there before
+        # any entity is added and the xp file's entities are added below
+        self.entity_store = entity_store
+        self.spatial_index = SpatialIndex()
+        self.occupancy = OccupancyGrid(width, height)
+        self.render_buckets = RenderBuckets()
+        # (x, y) -> the entity whose bg colour shows on that tile or None, worked out when a tile is first asked about
+        self.bg_entities = {}
+        self.terrain_layer = TerrainLayer()
 
         tile = tile_types.background_tile
         tile["graphic"]["bg"] = (random.randint(0,255),random.randint(0,255),random.randint(0,255))
@@ -38,47 +50,37 @@ class Section:
 
     def load_xp_data(self, filepath):
         if filepath:
-            xp_file = gzip.open("images/" + filepath)
-            raw_data = xp_file.read()
-            xp_file.close()
-            return xp_loader.load_xp_string(raw_data)
+            return xp_loader.load_xp_file("images/" + filepath, layers={0, 1})
 
     def load_tiles(self, data_name, xp_data):
         if xp_data is not None:
             self.loaded_tiles = data_name
-            for h in range(0, self.height):
-                if h < xp_data['height']:
-                    for w in range(0, self.width):
-                        if w < xp_data['width']:
-                            self.tiles[w, h]['walkable'] = True
-                            self.tiles[w, h]['graphic'] = xp_data['layer_data'][0]['cells'][w][h]
-                        else:
-                            break
-                else:
-                    break
+            layer = xp_data['layer_data'][0]
+            width, height = min(self.width, layer['width']), min(self.height, layer['height'])
+
+            # Field first, so this also lands on chunked tiles (where a slice is a copy)
+            self.tiles['walkable'][:width, :height] = True
+            self.tiles['graphic'][:width, :height] = layer['graphic'][:width, :height]
 
     def load_entities(self, data_name, xp_data):
         if xp_data is not None:
-            if len(xp_data['layer_data']) > 1 != None:
+            if len(xp_data['layer_data']) > 1:
                 self.loaded_tiles = data_name
-                for h in range(0, self.height):
-                    if h < xp_data['height']:
-                        for w in range(0, self.width):
-                            if w < xp_data['width']:
-                                self.entity_loader.load_entity(xp_data['layer_data'][1]['cells'][w][h][0], w, h, self)
-                                pass
-                            else:
-                                break
-                    else:
-                        break
+                layer = xp_data['layer_data'][1]
+                width, height = min(self.width, layer['width']), min(self.height, layer['height'])
+
+                chars = layer['graphic']['ch'][:width, :height].tolist()
+                for h in range(0, height):
+                    for w in range(0, width):
+                        self.entity_loader.load_entity(chars[w][h], w, h, self)
 
     def entities_sorted_for_rendering(self):
-        return sorted(self.entities, key=lambda x: x.render_order.value)
+        return iter(self.render_buckets)
 
     def render(self, console):
         if len(self.tiles) > 0:
             if self.invisible == False:
-                console.tiles_rgb[self.x : self.x + self.width, self.y: self.y + self.height] = self.tiles["graphic"]
+                console.tiles_rgb[self.x : self.x + self.width, self.y: self.y + self.height] = self.terrain_layer.draw(self.tiles, 0, 0, self.width, self.height)
 
             if self.ui is not None:
                 self.ui.render(console)
@@ -87,6 +89,18 @@ class Section:
                 if not entity.invisible:
                     console.print(entity.x, entity.y,entity.char, fg=entity.fg_color, bg=entity.bg_color)
 
+    def mark_tiles_dirty(self, x: int, y: int, width: int = 1, height: int = 1):
+        """ Call after changing how tiles look, so the next render draws them again """
+        self.terrain_layer.mark_dirty(x, y, width, height)
+
+    def loading_progress(self) -> float:
+        """ How much of any work the section is doing in the background is finished, from 0 to 1 """
+        return 1.0
+
+    def wait_until_loaded(self):
+        """ Blocks until any background work the section started is finished. Called before the section is updated or drawn. """
+        pass
+
     def update(self):
         for entity in self.entities:
             entity.update()
@@ -108,26 +122,91 @@ class Section:
 
     def add_entity(self, entity):
         self.entities.append(entity)
+        if self.entity_store is not None:
+            self.entity_store.add(entity)
+        self.spatial_index.add(entity)
+        self.occupancy.add(entity)
+        self.render_buckets.add(entity)
+        self.bg_entities.pop((entity.x, entity.y), None)
+        entity.section = self
+
+    def add_entities(self, entities):
+        """ add_entity for a whole list of entities, done a column at a time where it can be. Returns the entities' x and y positions as lists. """
+        self.entities.extend(entities)
+        if self.entity_store is not None:
+            rows = self.entity_store.add_many(entities)
+            xs, ys = self.entity_store.x[rows].tolist(), self.entity_store.y[rows].tolist()
+            blocks = self.entity_store.blocks_movement[rows].tolist()
+        else:
+            xs, ys = [entity.x for entity in entities], [entity.y for entity in entities]
+            blocks = [bool(entity.blocks_movement) for entity in entities]
+
+        self.spatial_index.add_many(entities, xs, ys)
+        self.occupancy.add_many(entities, xs, ys, blocks)
+        for entity, x, y in zip(entities, xs, ys):
+            self.render_buckets.add(entity)
+            self.bg_entities.pop((x, y), None)
+            entity.section = self
+
+        return xs, ys
 
     def remove_entity(self, entity):
         if entity in self.entities:
             self.entities.remove(entity)
+            self.spatial_index.remove(entity)
+            self.occupancy.remove(entity)
+            self.render_buckets.remove(entity)
+            self.bg_entities.pop((entity.x, entity.y), None)
+            if self.entity_store is not None:
+                self.entity_store.remove(entity)
+            entity.section = None
+
+    def entity_moved(self, entity, old_x: int, old_y: int):
+        """ Called by an entity in this section after it has moved from old_x, old_y """
+        self.spatial_index.move(entity, old_x, old_y)
+        self.occupancy.update(entity)
+        self.bg_entities.pop((old_x, old_y), None)
+        self.bg_entities.pop((entity.x, entity.y), None)
+
+    def move_entities(self, rows, dx, dy):
+        """ Moves many entities at once, rows being their rows in this section's entity store.
+        dx and dy can be single values or one per row. """
+        store = self.entity_store
+        old_x, old_y = store.x[rows], store.y[rows]
+        store.x[rows] += dx
+        store.y[rows] += dy
+
+        for entity, x, y in zip(store.entities_at_rows(np.asarray(rows)), old_x.tolist(), old_y.tolist()):
+            self.entity_moved(entity, x, y)
+
+    def entity_changed(self, entity):
+        """ Called by an entity in this section after something that affects how the section sees it has changed, e.g. whether it blocks movement """
+        self.occupancy.update(entity)
+        self.render_buckets.update(entity)
+        self.bg_entities.pop((entity.x, entity.y), None)
+
+    def get_bg_entity(self, x: int, y: int) -> Optional[Entity]:
+        """ The entity that colours the background of a tile: the highest render order entity on it that colours_bg, if any """
+        try:
+            return self.bg_entities[(x, y)]
+        except KeyError:
+            pass
+
+        bg_entity = None
+        for entity in self.spatial_index.at(x, y):
+            # On a tie the entity that arrived last wins
+            if entity.colours_bg and (bg_entity is None or entity.render_order.value >= bg_entity.render_order.value):
+                bg_entity = entity
+
+        self.bg_entities[(x, y)] = bg_entity
+        return bg_entity
 
     def get_entities_at_location(self, x: int, y: int):
-        entities = list()
-        for entity in self.entities:
-            if entity.x == x and entity.y == y:
-                entities.append(entity)
-
-        return entities
+        return list(self.spatial_index.at(x, y))
 
     def get_blocking_entity_at_location(self, location_x: int, location_y: int,) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.spatial_index.at(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
@@ -141,6 +220,16 @@ class Section:
 
         return entities
 
+    def get_entities_in_area(self, x: int, y: int, width: int, height: int):
+        return self.spatial_index.in_rect(x, y, width, height)
+
+    def is_passable(self, x: int, y: int) -> bool:
+        """ Walkable and not blocked by an entity """
+        return self.is_point_in_section(x, y) and bool(self.tiles["walkable"][x, y]) and not self.occupancy.blocked[x, y]
+
+    def passable_mask(self) -> np.ndarray:
+        return np.asarray(self.tiles["walkable"]) & ~self.occupancy.blocked
+
     def is_point_in_section(self, x,y):
         return (x >= 0) and (x < self.width) and (y >= 0) and (y < self.height)
 
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import copy
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, auto
 from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Tuple
 
@@ -11,7 +12,15 @@ from sections.section import Section
 from sections.map_section import MapSection
 import tile_types
 import utils.color
-from entities.entity import Actor, Entity, Prop
+import utils.rng
+from chunked_tiles import ChunkedTiles
+from landscape_generation import GenerationStages, LandscapeChunk, LandscapeParameters, generate_landscape_chunk, make_landscape_noise
+from entities.entity import Actor, Entity
+from entities.entity_store import EntityStore
+from pathfinding.cost_map import CostMap
+from pathfinding.flow_fields import FlowFields
+from pathfinding.hierarchical import HierarchicalPathfinder
+from pathfinding.path_requests import PathRequestQueue
 from tcod.console import Console
 from utils.utils import Neighbourhood
 from entities.player import Player
@@ -20,15 +29,31 @@ if TYPE_CHECKING:
     from engine import Engine
 
 
+# A chunk of a chunked map holds both the tiles and the artefact tiles for its area
+landscape_chunk_dt = np.dtype([("tiles", tile_types.tile_dt), ("artefact_tiles", np.int64)])
+
+
 class TestMapSection(MapSection):
-    def __init__(self, engine, x: int, y: int, width: int, height: int, xp_filepath: str = "") -> None:
-        super().__init__(engine, x, y, width, height, xp_filepath)
+    def __init__(self, engine, x: int, y: int, width: int, height: int, xp_filepath: str = "", chunk_size: Optional[int] = None, background_generation: bool = False, seed: int = 1237) -> None:
+        super().__init__(engine, x, y, width, height, xp_filepath, EntityStore())
+
+        # The world seed drives the gameplay and effect streams too, so the whole run can be replayed from it
+        self.seed = seed
+        utils.rng.seed_streams(seed)
 
         self.engine = engine
         self.width, self.height = width, height
-        self.tiles = np.full((self.width, self.height), fill_value=tile_types.background_tile, order="F")
-        self.artefact_tiles = np.full((self.width, self.height), fill_value=ord(" "), order="F")
+        self.world = None
+        if chunk_size is None:
+            self.tiles = np.full((self.width, self.height), fill_value=tile_types.background_tile, order="F")
+            self.artefact_tiles = np.full((self.width, self.height), fill_value=ord(" "), order="F")
+        self.cost_map = None
+        self.flow_fields = None
+        self.pathfinder = None
+        self.path_requests = None
         self.cost = None
+        self.graph = None
+        self.generation_future = None
 
         #Map Variables
         self.map_height = height
@@ -45,46 +70,176 @@ class TestMapSection(MapSection):
         self.player =  Player(self.engine, 12,8)
         self.add_entity(self.player)
 
-        super().generate_landscape(self.engine, self, width, height)
+        if chunk_size is not None:
+            self.setup_chunked_world(chunk_size, seed)
+        elif background_generation:
+            self.start_background_generation()
+        else:
+            self.generate_landscape(self, seed)
+
+        self.build_cost_map()
+
+    def build_cost_map(self):
+        # Requests made before there's a pathfinder wait in the queue until there is one
+        self.path_requests = PathRequestQueue(None)
+
+        # A background generation worker builds these alongside the landscape, see finish_background_generation
+        if self.generation_future is None:
+            self.use_cost_map(*self.build_terrain_pathfinding(self.tiles))
+
+    def build_terrain_pathfinding(self, tiles):
+        """ A cost map of just the terrain and the cluster graph over it, the slow part of setting up pathfinding.
+        Touches nothing on the section, so it can run on the generation worker. """
+        cost_map = CostMap(tiles)
+
+        # Long distance routes, see HierarchicalPathfinder.find_path
+        pathfinder = HierarchicalPathfinder(cost_map)
+        # Build the cluster graph now rather than in the middle of the first frame that asks for a path
+        pathfinder.update()
+
+        return cost_map, pathfinder
+
+    def use_cost_map(self, cost_map, pathfinder):
+        """ Switches over to a cost map built by build_terrain_pathfinding, counting the section's entities on it """
+        self.cost_map = cost_map
+        self.pathfinder = pathfinder
+        if self.entities:
+            self.cost_map.add_entities(self.entities, [entity.x for entity in self.entities], [entity.y for entity in self.entities])
+
+        self.cost = self.cost_map.cost
+        self.graph = self.cost_map.graph
+
+        # Anything heading for the player reads its next step from here, see FlowFields.next_step
+        self.flow_fields = FlowFields(self.cost_map)
+        self.flow_fields.set_goal("player", [(self.player.x, self.player.y)])
+
+        self.path_requests.find_path = self.pathfinder.find_path
+        # Terrain edits and props rebuild their clusters out of the same per frame budget as the path requests
+        self.path_requests.rebuild_next = self.pathfinder.rebuild_next
+
+    def start_background_generation(self):
+        """ Generates the landscape on a worker thread (the heavy stages are numpy and tcod calls, which release the GIL)
+        into arrays of its own, which are swapped in once they're finished. Until then the section shows blank tiles. """
+        landscape = LandscapeChunk(
+            np.full((self.width, self.height), fill_value=tile_types.background_tile, order="F"),
+            np.full((self.width, self.height), fill_value=ord(" "), order="F"))
+
+        self.generation_stages = GenerationStages()
+        self.generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="landscape")
+        self.generation_future = self.generation_executor.submit(self.generate_in_background, landscape)
+        self.generated_landscape = landscape
+
+    def generate_in_background(self, landscape):
+        """ Runs on the worker, returns the cost map and pathfinder for the finished landscape """
+        self.generate_landscape(landscape, self.seed, stages=self.generation_stages)
+        return self.build_terrain_pathfinding(landscape.tiles)
+
+    def finish_background_generation(self, block: bool):
+        if self.generation_future is None:
+            return
+        if not block and not self.generation_future.done():
+            return
+
+        # Re-raises anything that went wrong on the worker. Everything slow was done there, all that's left is swapping it in.
+        cost_map, pathfinder = self.generation_future.result()
+        self.tiles = self.generated_landscape.tiles
+        self.artefact_tiles = self.generated_landscape.artefact_tiles
+        self.use_cost_map(cost_map, pathfinder)
+
+        self.generation_executor.shutdown(wait=False)
+        self.generation_future = None
+        self.generated_landscape = None
+
+    def loading_progress(self) -> float:
+        self.finish_background_generation(block=False)
+        if self.generation_future is None:
+            return 1.0
+        return self.generation_stages.progress
+
+    def wait_until_loaded(self):
+        self.finish_background_generation(block=True)
+
+    def setup_chunked_world(self, chunk_size, seed=1237, parameters=None):
+        """ Holds the map in chunks that are generated as the view gets near them, rather than generating it all up front """
+        self.landscape_seed = seed
+        self.landscape_parameters = parameters if parameters is not None else LandscapeParameters()
+        self.landscape_noise = make_landscape_noise(seed, self.landscape_parameters)
+
+        fill_value = np.zeros((), dtype=landscape_chunk_dt)
+        fill_value["tiles"] = tile_types.background_tile
+        fill_value["artefact_tiles"] = ord(" ")
+
+        self.world = ChunkedTiles(self.width, self.height, landscape_chunk_dt, fill_value, self.generate_chunk, chunk_size)
+        self.tiles = self.world.view("tiles")
+        self.artefact_tiles = self.world.view("artefact_tiles")
+        self.prefetch_chunks()
+
+    def generate_chunk(self, chunk, x, y):
+        landscape = LandscapeChunk(chunk["tiles"], chunk["artefact_tiles"])
+        generate_landscape_chunk(landscape, (x, y), self.landscape_seed, self.landscape_parameters, self.landscape_noise)
+        self.mark_tiles_dirty(x, y, *landscape.tiles.shape)
+        if self.cost_map is not None:
+            self.cost_map.update_tiles(x, y, landscape.tiles)
+
+    def prefetch_chunks(self):
+        # Keep a chunk's worth of map around the view generated, so scrolling never waits on generation
+        if self.world is not None:
+            self.world.prefetch(self.map_render_x, self.map_render_y, self.map_render_width, self.map_render_height, margin=self.world.chunk_size)
 
 
     def update(self):
-        self.cost = np.array(self.tiles["walkable"], dtype=np.int8)
-
-        """ Very expensive!
-        for x in range(0, self.width):
-            for y in range(0, self.height):
-                self.cost[x, y] += self.tiles[x, y]["cost"]
-        """
-        for entity in self.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and self.cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                if isinstance(entity, Actor):
-                    self.cost[entity.x, entity.y] += 10
-                if isinstance(entity, Prop):
-                    self.cost[entity.x, entity.y] += 1000
-
-        self.graph = tcod.path.SimpleGraph(cost=self.cost, cardinal=2, diagonal=3)
+        self.prefetch_chunks()
+
+        # self.cost and self.graph are kept up to date by self.cost_map as tiles and entities change, so there's nothing to rebuild here
+
+        # Answer as many path requests as fit in this frame's budget, the rest carry over to the next update
+        if self.pathfinder is not None:
+            self.path_requests.service()
+
+    def request_path(self, start: Tuple[int, int], goal: Tuple[int, int]):
+        """ Returns a Future for the path from start to goal, which is done once an update has got round to it """
+        return self.path_requests.request(start, goal)
 
     def render(self, console: Console) -> None:
         """ Renders the game to console. """
-        console.tiles_rgb[self.map_x_offset: self.map_render_width + self.map_x_offset, self.map_y_offset: self.map_render_height + self.map_y_offset] = self.tiles[self.map_render_x:self.map_render_x + self.map_render_width, self.map_render_y:self.map_render_y + self.map_render_height]["graphic"]
-
-        entity_console = Console(console.width, console.height)
-        for entity in self.entities_sorted_for_rendering():
-            x = entity.x - self.map_render_x + self.map_x_offset
-            y = entity.y - self.map_render_y + self.map_y_offset
+        console.tiles_rgb[self.map_x_offset: self.map_render_width + self.map_x_offset, self.map_y_offset: self.map_render_height + self.map_y_offset] = self.terrain_layer.draw(self.tiles, self.map_render_x, self.map_render_y, self.map_render_width, self.map_render_height)
 
-            entity_console.print(x=x, y=y, string=entity.char, fg=entity.fg_colour, bg=self.get_tile_bg_colour(entity.x, entity.y))
-            entity_console.blit(console, src_x=x, dest_x=x, src_y=y, dest_y=y, width=1, height=1)
+        self.render_entities(console)
 
         #self.message_log.render(console=console, x=0, y=self.map_height + self.map_y_offset + 2, width=40, height=10)
         #self.ui.render(console)
 
+    def render_entities(self, console: Console) -> None:
+        """ Draws the entities inside the render window over the terrain already on console.
+        Each tile shows its highest render order entity, on the bg of its highest render order entity that colours_bg
+        or on the tile's own bg if none do. Only the entity store's columns are read, so the cost follows what's on screen. """
+        store = self.entity_store
+        rows = store.rows_in_rect(self.map_render_x, self.map_render_y, self.map_render_width, self.map_render_height)
+        if len(rows) == 0:
+            return
+
+        # Lowest render order first, so the last entity seen on a tile is the one on top.
+        # Ties go to whichever was added last, by seq rather than row as removing an entity moves another one's row
+        rows = rows[np.lexsort((store.seq[rows], store.render_order[rows]))]
+        screen_x = store.x[rows] - self.map_render_x + self.map_x_offset
+        screen_y = store.y[rows] - self.map_render_y + self.map_y_offset
+        tiles = screen_x * console.height + screen_y
+
+        # np.unique keeps the first of each tile, so look from the top down
+        drawn_tiles, top = np.unique(tiles[::-1], return_index=True)
+        top = len(rows) - 1 - top
+        cells = console.tiles_rgb[screen_x[top], screen_y[top]]
+        cells["ch"] = store.ch[rows[top]]
+        cells["fg"] = store.fg[rows[top]]
+
+        colouring = np.flatnonzero(store.colours_bg[rows])
+        if len(colouring) > 0:
+            coloured_tiles, top_colouring = np.unique(tiles[colouring][::-1], return_index=True)
+            top_colouring = colouring[len(colouring) - 1 - top_colouring]
+            cells["bg"][np.searchsorted(drawn_tiles, coloured_tiles)] = store.bg[rows[top_colouring]]
+
+        console.tiles_rgb[screen_x[top], screen_y[top]] = cells
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
@@ -125,12 +280,8 @@ class TestMapSection(MapSection):
         return neighbours
 
     def can_place_prop_in_tile(self, x: int, y: int):
-        if self.get_actor_at_location(x, y) is not None:
-            return False
-        if len(self.get_entities_at_location(x, y)) > 0:
-            return False
-
-        return True
+        # Anything on the tile rules it out, actors included
+        return self.occupancy.is_area_empty(x, y)
 
     @property
     def actors(self) -> Iterator[Actor]:
@@ -142,9 +293,9 @@ class TestMapSection(MapSection):
         )
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.spatial_index.at(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
 
         return None
 
@@ -158,34 +309,57 @@ class TestMapSection(MapSection):
         return entities
 
     def get_entities_at_location(self, x: int, y: int) -> list(Entity):
-        entities = list()
-        for entity in self.entities:
-            if entity.x == x and entity.y == y:
-                entities.append(entity)
-
-        return entities
+        return list(self.spatial_index.at(x, y))
 
     def get_tile_bg_colour(self, x: int, y: int) -> Tuple[int, int, int]:
-        for entity in reversed(sorted(self.get_entities_at_location(x, y), key=lambda x: x.render_order.value)):
-            if entity.colours_bg:
-                return entity.bg_colour
+        bg_entity = self.get_bg_entity(x, y)
+        if bg_entity is not None:
+            return bg_entity.bg_colour
 
         np_colour_array = self.tiles[x, y]["graphic"]["bg"]
         return [np_colour_array[0], np_colour_array[1], np_colour_array[2]]
 
     def get_blocking_entity_at_location(self, location_x: int, location_y: int,) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.spatial_index.at(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
 
+    def add_entity(self, entity):
+        super().add_entity(entity)
+        if self.cost_map is not None:
+            self.cost_map.add_entity(entity)
+
+    def add_entities(self, entities):
+        xs, ys = super().add_entities(entities)
+        if self.cost_map is not None:
+            self.cost_map.add_entities(entities, xs, ys)
+
+        return xs, ys
+
+    def remove_entity(self, entity):
+        if entity in self.entities and self.cost_map is not None:
+            self.cost_map.remove_entity(entity)
+        super().remove_entity(entity)
+
+    def entity_moved(self, entity, old_x: int, old_y: int):
+        super().entity_moved(entity, old_x, old_y)
+        if self.cost_map is not None:
+            self.cost_map.update_entity(entity)
+        if self.flow_fields is not None and entity is self.player:
+            self.flow_fields.set_goal("player", [(entity.x, entity.y)])
+
+    def entity_changed(self, entity):
+        super().entity_changed(entity)
+        if self.cost_map is not None:
+            self.cost_map.update_entity(entity)
+
     def replace_tile(self, x: int, y: int, tile: np.ndarray):
         self.tiles[x, y] = tile
+        self.mark_tiles_dirty(x, y)
+        if self.cost_map is not None:
+            self.cost_map.update_tiles(x, y, self.tiles[x:x + 1, y:y + 1])
 
     def update_movement_cage(self, dx,dy):
         self.map_movement_pawn[0] += dx
@@ -0,0 +1,73 @@
+from typing import Dict, List, Tuple
+
+##################################
+# Which entities are on which tile, so finding what's at a location doesn't mean looking through every entity.
+# Tiles are buckets in a dict keyed by (x, y), only tiles with something on them have a bucket.
+# The owning section keeps it current as entities are added, removed and moved.
+##################################
+
+
+class SpatialIndex:
+    def __init__(self) -> None:
+        self.buckets: Dict[Tuple[int, int], List] = {}
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def add(self, entity):
+        self.buckets.setdefault((entity.x, entity.y), []).append(entity)
+
+    def add_many(self, entities, xs, ys):
+        for entity, x, y in zip(entities, xs, ys):
+            self.buckets.setdefault((x, y), []).append(entity)
+
+    def remove(self, entity):
+        self.remove_from(entity, entity.x, entity.y)
+
+    def move(self, entity, old_x: int, old_y: int):
+        self.remove_from(entity, old_x, old_y)
+        self.add(entity)
+
+    def remove_from(self, entity, x: int, y: int):
+        bucket = self.buckets.get((x, y))
+        if bucket is None or entity not in bucket:
+            return
+
+        bucket.remove(entity)
+        if not bucket:
+            del self.buckets[(x, y)]
+
+    def at(self, x: int, y: int) -> List:
+        """ The entities on a tile, in the order they arrived there. Don't change the list, it belongs to the index. """
+        return self.buckets.get((x, y), [])
+
+    def at_points(self, points) -> List:
+        entities = list()
+        for x, y in points:
+            entities.extend(self.buckets.get((x, y), ()))
+
+        return entities
+
+    def neighbourhood(self, x: int, y: int, radius: int = 1, include_centre: bool = True) -> List:
+        """ The entities within radius tiles of x, y, diagonals included """
+        entities = self.in_rect(x - radius, y - radius, radius * 2 + 1, radius * 2 + 1)
+        if not include_centre:
+            centre = self.at(x, y)
+            entities = [entity for entity in entities if entity not in centre]
+
+        return entities
+
+    def in_rect(self, x: int, y: int, width: int, height: int) -> List:
+        """ The entities in a rectangle, looking through whichever is smaller: the rectangle's tiles or the occupied tiles """
+        if width <= 0 or height <= 0:
+            return []
+
+        if width * height <= len(self.buckets):
+            return self.at_points((tile_x, tile_y) for tile_y in range(y, y + height) for tile_x in range(x, x + width))
+
+        entities = list()
+        for (tile_x, tile_y), bucket in self.buckets.items():
+            if x <= tile_x < x + width and y <= tile_y < y + height:
+                entities.extend(bucket)
+
+        return entities
@@ -0,0 +1,75 @@
+import numpy as np
+
+##################################
+# A copy of the terrain graphics a section shows on screen, kept between frames.
+# Terrain only changes when something writes to the tiles (wear, replace_tile, a chunk being generated), and whatever
+# does that marks the area dirty, so a frame only has to copy the dirty tiles rather than the whole view.
+# When the view scrolls, what's still on screen is shifted across and only the newly exposed rows and columns are read.
+##################################
+
+
+class TerrainLayer:
+    def __init__(self) -> None:
+        self.graphic = None
+        self.x, self.y = 0, 0
+        self.tiles = None
+
+        # (x, y, width, height) areas of the map whose graphics have changed since the last draw
+        self.dirty = set()
+        self.all_dirty = True
+
+    def mark_dirty(self, x: int, y: int, width: int = 1, height: int = 1):
+        if self.all_dirty:
+            return
+
+        self.dirty.add((x, y, width, height))
+        if self.graphic is not None and len(self.dirty) > self.graphic.size:
+            # Cheaper to read the whole view again than to go through all of these
+            self.invalidate()
+
+    def invalidate(self):
+        self.all_dirty = True
+        self.dirty.clear()
+
+    def draw(self, tiles, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """ The graphics of tiles[x:x + width, y:y + height], brought up to date. The array is reused by the next draw. """
+        dx, dy = x - self.x, y - self.y
+        if self.all_dirty or tiles is not self.tiles or self.graphic is None or self.graphic.shape != (width, height) or abs(dx) >= width or abs(dy) >= height:
+            self.graphic = np.asfortranarray(tiles[x:x + width, y:y + height]["graphic"])
+        else:
+            if dx or dy:
+                self.scroll(tiles, dx, dy)
+            self.patch(tiles, x, y)
+
+        self.x, self.y, self.tiles = x, y, tiles
+        self.all_dirty = False
+        self.dirty.clear()
+        return self.graphic
+
+    def scroll(self, tiles, dx: int, dy: int):
+        """ Moves the view by dx, dy, keeping the part of it that's still on screen """
+        graphic = self.graphic
+        width, height = graphic.shape
+        x, y = self.x + dx, self.y + dy
+
+        graphic[max(0, -dx):width - max(0, dx), max(0, -dy):height - max(0, dy)] = graphic[max(0, dx):width - max(0, -dx), max(0, dy):height - max(0, -dy)]
+
+        # Read in the exposed columns, then the exposed rows
+        if dx > 0:
+            graphic[width - dx:, :] = tiles[x + width - dx:x + width, y:y + height]["graphic"]
+        elif dx < 0:
+            graphic[:-dx, :] = tiles[x:x - dx, y:y + height]["graphic"]
+
+        if dy > 0:
+            graphic[:, height - dy:] = tiles[x:x + width, y + height - dy:y + height]["graphic"]
+        elif dy < 0:
+            graphic[:, :-dy] = tiles[x:x + width, y:y - dy]["graphic"]
+
+    def patch(self, tiles, x: int, y: int):
+        """ Copies in the dirty tiles that are in view """
+        width, height = self.graphic.shape
+        for area_x, area_y, area_width, area_height in self.dirty:
+            x0, y0 = max(x, area_x), max(y, area_y)
+            x1, y1 = min(x + width, area_x + area_width), min(y + height, area_y + area_height)
+            if x0 < x1 and y0 < y1:
+                self.graphic[x0 - x:x1 - x, y0 - y:y1 - y] = tiles[x0:x1, y0:y1]["graphic"]
@@ -0,0 +1,128 @@
+import os
+import tracemalloc
+
+import numpy as np
+
+import tile_types
+from chunked_tiles import ChunkedTiles
+from occupancy_grid import OccupancyGrid
+from pathfinding.cost_map import CostMap
+
+# Chunking only bounds how many tiles are held in memory. The cost map and occupancy grid built over a chunked map
+# are still whole map arrays of a few bytes a tile, these pin that down so it doesn't grow unnoticed.
+
+width, height, chunk_size = 512, 512, 32
+
+
+def make_world(generated, max_loaded_chunks=4):
+    def generate_chunk(chunk, x, y):
+        generated.append((x, y))
+        chunk["walkable"] = True
+
+    # Tiles that haven't been generated can't be walked on, so they can be told apart in the cost map
+    fill_value = tile_types.background_tile.copy()
+    fill_value["walkable"] = False
+    return ChunkedTiles(width, height, tile_types.tile_dt, fill_value, generate_chunk, chunk_size, max_loaded_chunks)
+
+
+def test_cost_map_over_chunked_tiles_generates_nothing():
+    generated = []
+    world = make_world(generated)
+    world.prefetch(0, 0, chunk_size, chunk_size)
+
+    cost_map = CostMap(world.view())
+
+    assert generated == [(0, 0)]
+    assert len(world.chunks) <= world.max_loaded_chunks
+    assert (cost_map.cost[:chunk_size, :chunk_size] > 0).all()
+    assert not cost_map.cost[chunk_size:, :].any()
+
+
+def test_cost_map_over_chunked_tiles_memory():
+    world = make_world([])
+    world.prefetch(0, 0, chunk_size, chunk_size)
+
+    tracemalloc.start()
+    cost_map = CostMap(world.view())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # base, the two overlays and the two costs are int32, building them never costs as much as a copy of the tiles would
+    arrays = (cost_map.base, cost_map.entity_overlay, cost_map.static_overlay, cost_map.cost, cost_map.static_cost)
+    assert sum(array.nbytes for array in arrays) == width * height * 20
+    assert peak < width * height * tile_types.tile_dt.itemsize
+
+
+def test_occupancy_grid_size():
+    occupancy = OccupancyGrid(width, height)
+    assert occupancy.counts.nbytes + occupancy.blocking_counts.nbytes + occupancy.blocked.nbytes == width * height * 9
+
+
+def make_small_world(generated, max_loaded_chunks=2):
+    def generate_chunk(chunk, x, y):
+        generated.append((x, y))
+        chunk["cost"] = x + y
+
+    return ChunkedTiles(20, 12, tile_types.tile_dt, tile_types.background_tile, generate_chunk, 8, max_loaded_chunks)
+
+
+def test_chunks_are_generated_on_first_touch():
+    generated = []
+    world = make_small_world(generated, max_loaded_chunks=8)
+    view = world.view()
+    assert generated == []
+
+    assert view[9, 3]["cost"] == 8
+    assert generated == [(8, 0)]
+    assert view["cost"][10, 4] == 8
+    assert generated == [(8, 0)]
+
+
+def test_reads_and_writes_across_chunk_boundaries():
+    world = make_small_world([], max_loaded_chunks=8)
+    view = world.view()
+
+    view["wear"][6:10, 6:10] = np.arange(16, dtype=np.float32).reshape(4, 4)
+    assert sorted(world.chunks) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert view["wear"][6:10, 6:10].tolist() == np.arange(16).reshape(4, 4).tolist()
+    assert view[7, 8]["wear"] == 6
+    assert view[6:10, 6:10]["cost"].tolist() == [[0, 0, 8, 8], [0, 0, 8, 8], [8, 8, 16, 16], [8, 8, 16, 16]]
+
+
+def test_single_tile_writes_land_but_slices_are_copies():
+    world = make_small_world([], max_loaded_chunks=8)
+    view = world.view()
+
+    view[3, 3]["wear"] = 5
+    assert view[3, 3]["wear"] == 5
+    before = view["wear"][0:4, 0:4]
+
+    view[0:4, 0:4]["wear"] = 7
+    assert np.array_equal(view["wear"][0:4, 0:4], before)
+    assert not (before == 7).any()
+
+
+def test_least_recently_used_chunks_swap_out_and_back():
+    generated = []
+    world = make_small_world(generated, max_loaded_chunks=2)
+    view = world.view()
+
+    view["wear"][1, 1] = 1
+    view["wear"][9, 1] = 2
+    # Touch (0, 0) again so (1, 0) is the least recently used
+    assert view["wear"][1, 1] == 1
+    view["wear"][17, 1] = 3
+
+    assert list(world.chunks) == [(0, 0), (2, 0)]
+    assert world.swapped_chunks == {(1, 0)}
+    assert os.path.isfile(world.get_swap_path((1, 0)))
+
+    # Swapped back in with what was written, not generated again
+    assert view["wear"][9, 1] == 2
+    assert generated == [(0, 0), (8, 0), (16, 0)]
+    assert len(world.chunks) == 2 and (0, 0) not in world.chunks
+
+    # And read_loaded sees every chunk without loading any
+    wear = np.array(view["wear"])
+    assert (wear[1, 1], wear[9, 1], wear[17, 1]) == (1, 2, 3)
+    assert list(world.chunks) == [(2, 0), (1, 0)]
@@ -0,0 +1,21 @@
+import numpy as np
+
+import utils.color
+import utils.color_array
+
+
+def test_lerp_truncates_like_int():
+    assert utils.color_array.lerp((0, 0, 0), (10, 10, 10), 0.55).tolist() == [5, 5, 5]
+    assert utils.color.color_lerp((200, 100, 0), (0, 0, 0), 0.5) == (100, 50, 0)
+
+
+def test_t_outside_0_1_saturates():
+    assert utils.color_array.lerp((200, 200, 200), (0, 0, 0), -0.8).tolist() == [255, 255, 255]
+    assert utils.color_array.lerp((200, 200, 200), (0, 0, 0), 1.5).tolist() == [0, 0, 0]
+    assert utils.color_array.blend((100, 0, 250), (0, 0, 0), 2).tolist() == [200, 0, 255]
+
+
+def test_out_saturates_too():
+    out = np.zeros((3, 3), dtype=np.uint8)
+    utils.color_array.lerp((200, 200, 200), (0, 0, 0), np.array([-0.8, 0.5, 2.0]), out=out)
+    assert out.tolist() == [[255, 255, 255], [100, 100, 100], [0, 0, 0]]
@@ -0,0 +1,81 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pygame")
+
+from entities.entity import Prop
+from entities.entity_store import EntityStore
+from sections.section import Section
+
+width, height = 12, 10
+
+
+def drive(check):
+    """ Adds, moves and removes entities at random through the section, calling check(section) after every change.
+    Removing goes through the store's swap-remove, so other entities' rows move around under the indexes. """
+    rng = random.Random(7)
+    section = Section(None, 0, 0, width, height, entity_store=EntityStore())
+    section.add_entities([Prop(x=rng.randrange(width), y=rng.randrange(height), blocks_movement=rng.random() < 0.5) for _ in range(20)])
+    check(section)
+
+    for _ in range(400):
+        entities = section.entities
+        action = rng.random()
+        if action < 0.3 or not entities:
+            section.add_entity(Prop(x=rng.randrange(width), y=rng.randrange(height), blocks_movement=rng.random() < 0.5))
+        elif action < 0.5:
+            section.remove_entity(rng.choice(entities))
+        elif action < 0.7:
+            rng.choice(entities).move(rng.randint(-1, 1), rng.randint(-1, 1))
+        elif action < 0.75:
+            entity = rng.choice(entities)
+            entity.blocks_movement = not entity.blocks_movement
+        elif action < 0.85:
+            # Sometimes off the edge of the section
+            rng.choice(entities).place(rng.randrange(-1, width + 1), rng.randrange(-1, height + 1))
+        else:
+            rows = rng.sample(range(len(section.entity_store)), min(3, len(section.entity_store)))
+            section.move_entities(rows, rng.randint(-1, 1), rng.randint(-1, 1))
+        check(section)
+
+
+def entities_by_tile(section):
+    tiles = {}
+    for entity in section.entities:
+        tiles.setdefault((entity.x, entity.y), []).append(entity)
+    return tiles
+
+
+def test_spatial_index_matches_a_scan():
+    def check(section):
+        expected = entities_by_tile(section)
+        assert set(section.spatial_index.buckets) == set(expected)
+        for tile, entities in expected.items():
+            assert sorted(map(id, section.spatial_index.at(*tile))) == sorted(map(id, entities))
+        assert len(section.spatial_index) == len(section.entities)
+
+        # Every entity's row in the store still holds its own position
+        store = section.entity_store
+        assert all(store.entities[entity.row] is entity and (store.x[entity.row], store.y[entity.row]) == (entity.x, entity.y) for entity in section.entities)
+
+    drive(check)
+
+
+def test_occupancy_grid_matches_a_scan():
+    def check(section):
+        counts = np.zeros((width, height), dtype=np.int32)
+        blocking = np.zeros((width, height), dtype=np.int32)
+        for entity in section.entities:
+            if 0 <= entity.x < width and 0 <= entity.y < height:
+                counts[entity.x, entity.y] += 1
+                blocking[entity.x, entity.y] += bool(entity.blocks_movement)
+
+        occupancy = section.occupancy
+        assert np.array_equal(occupancy.counts, counts)
+        assert np.array_equal(occupancy.blocking_counts, blocking)
+        assert np.array_equal(occupancy.blocked, blocking > 0)
+        assert set(occupancy.counted) == set(section.entities)
+
+    drive(check)
@@ -0,0 +1,64 @@
+import numpy as np
+
+import tile_types
+from entities.entity import Prop
+from pathfinding.cost_map import CostMap
+from pathfinding.flow_fields import FlowFields
+
+
+def make_flow_fields(width=30, height=20):
+    tiles = np.full((width, height), fill_value=tile_types.floor, order="F")
+    # A wall across the middle with a gap at the bottom
+    tiles["walkable"][15, :height - 3] = False
+    cost_map = CostMap(tiles)
+    return cost_map, FlowFields(cost_map)
+
+
+def test_next_step_walks_down_the_distance_field():
+    cost_map, flow_fields = make_flow_fields()
+    flow_fields.set_goal("goal", [(25, 2)])
+
+    x, y = 2, 2
+    distance = flow_fields.distance("goal", x, y)
+    steps = 0
+    while (x, y) != (25, 2):
+        next_x, next_y = flow_fields.next_step("goal", x, y)
+        assert max(abs(next_x - x), abs(next_y - y)) == 1
+        assert cost_map.cost[next_x, next_y] > 0
+
+        # Each step pays exactly what it costs to walk onto the next tile
+        next_distance = flow_fields.distance("goal", next_x, next_y)
+        step_cost = int(cost_map.cost[x, y]) * (2 if next_x == x or next_y == y else 3)
+        assert distance - next_distance == step_cost
+        x, y, distance = next_x, next_y, next_distance
+        steps += 1
+        assert steps < 100
+
+    assert flow_fields.next_step("goal", 25, 2) is None
+    # Had to go round the wall
+    assert steps > 23
+
+
+def test_cost_changes_in_the_area_rebuild_the_field():
+    cost_map, flow_fields = make_flow_fields()
+    flow_fields.set_goal("left", [(2, 2)], area=(0, 0, 15, 20))
+    flow_fields.set_goal("right", [(25, 2)], area=(16, 0, 30, 20))
+    left, right = flow_fields.field("left"), flow_fields.field("right")
+    assert not left.dirty and not right.dirty
+
+    # Something blocking the straight route on the left
+    assert flow_fields.next_step("left", 6, 2) == (5, 2)
+    distance = flow_fields.distance("left", 6, 2)
+    cost_map.add_entity(Prop(x=5, y=2, blocks_movement=True))
+    assert left.dirty and not right.dirty
+
+    assert flow_fields.next_step("left", 6, 2) != (5, 2)
+    assert flow_fields.distance("left", 6, 2) > distance
+    assert not left.dirty and not right.dirty
+
+
+def test_goals_that_cant_be_reached():
+    cost_map, flow_fields = make_flow_fields()
+    flow_fields.set_goal("goal", [(25, 2)], area=(16, 0, 30, 20))
+    assert flow_fields.next_step("goal", 2, 2) is None
+    assert flow_fields.distance("goal", 2, 2) is None
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+import tile_types
+from entities.entity import Actor, Prop
+from pathfinding.cost_map import CostMap
+from pathfinding.hierarchical import HierarchicalPathfinder
+
+
+def make_pathfinder(width=64, height=48):
+    tiles = np.full((width, height), fill_value=tile_types.floor, order="F")
+    cost_map = CostMap(tiles)
+    pathfinder = HierarchicalPathfinder(cost_map)
+    pathfinder.update()
+    return tiles, cost_map, pathfinder
+
+
+def path_cost(cost_map, start, path):
+    total, (x, y) = 0, start
+    for next_x, next_y in path:
+        assert max(abs(next_x - x), abs(next_y - y)) == 1
+        total += int(cost_map.cost[next_x, next_y]) * (2 if next_x == x or next_y == y else 3)
+        x, y = next_x, next_y
+    return total
+
+
+def make_wall():
+    wall = tile_types.floor.copy()
+    wall["walkable"] = False
+    return wall
+
+
+def test_actors_dont_dirty_the_graph():
+    _, cost_map, pathfinder = make_pathfinder()
+
+    actors = [Actor(x=x, y=20, animal=SimpleNamespace()) for x in range(0, 64, 3)]
+    for actor in actors:
+        actor.blocks_movement = True
+    cost_map.add_entities(actors, [actor.x for actor in actors], [actor.y for actor in actors])
+    for actor in actors[:5]:
+        actor.x += 1
+        cost_map.update_entity(actor)
+    cost_map.remove_entity(actors[-1])
+
+    assert not pathfinder.dirty_clusters and not pathfinder.stale_clusters
+
+
+def test_props_only_make_the_graph_stale():
+    _, cost_map, pathfinder = make_pathfinder()
+    cost_map.add_entity(Prop(x=20, y=20, blocks_movement=True))
+
+    assert not pathfinder.dirty_clusters
+    assert pathfinder.stale_clusters == {(1, 1)}
+
+    # Queries don't wait for stale clusters
+    pathfinder.find_path((2, 2), (60, 40))
+    assert pathfinder.stale_clusters == {(1, 1)}
+
+
+def test_routes_around_actors():
+    _, cost_map, pathfinder = make_pathfinder()
+    start, goal = (5, 24), (58, 24)
+    path = pathfinder.find_path(start, goal)
+
+    actors = [Actor(x=x, y=y, animal=SimpleNamespace()) for x, y in path[10:40:3]]
+    for actor in actors:
+        actor.blocks_movement = True
+    cost_map.add_entities(actors, [actor.x for actor in actors], [actor.y for actor in actors])
+
+    path = pathfinder.find_path(start, goal)
+    assert path[-1] == goal
+    assert not any((actor.x, actor.y) in path for actor in actors)
+
+
+def test_routes_around_props():
+    _, cost_map, pathfinder = make_pathfinder()
+    start, goal = (5, 24), (58, 24)
+    clear_cost = path_cost(cost_map, start, pathfinder.find_path(start, goal))
+
+    # A wall of props across the straight route, longer than a cluster, with room to walk round either end
+    props = [Prop(x=30, y=y, blocks_movement=True) for y in range(6, 42)]
+    cost_map.add_entities(props, [prop.x for prop in props], [prop.y for prop in props])
+    pathfinder.update()
+
+    path = pathfinder.find_path(start, goal)
+    assert path[-1] == goal
+    assert not any((prop.x, prop.y) in path for prop in props)
+    assert path_cost(cost_map, start, path) < clear_cost * 2
+
+
+def test_terrain_changes_rebuild_like_a_fresh_graph():
+    tiles, cost_map, pathfinder = make_pathfinder()
+    tiles[20:40, 10] = make_wall()
+    cost_map.update_tiles(0, 0, tiles)
+
+    fresh = HierarchicalPathfinder(cost_map)
+    for start, goal in (((2, 2), (60, 40)), ((30, 2), (30, 40)), ((10, 12), (50, 5))):
+        assert path_cost(cost_map, start, pathfinder.find_path(start, goal)) == path_cost(cost_map, start, fresh.find_path(start, goal))
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import tile_types
+from landscape_generation import LandscapeChunk, generate_landscape
+
+
+def make_landscape(width=60, height=40):
+    return LandscapeChunk(
+        np.full((width, height), fill_value=tile_types.background_tile, order="F"),
+        np.full((width, height), fill_value=ord(" "), order="F"))
+
+
+def test_same_seed_same_landscape():
+    first, second = make_landscape(), make_landscape()
+    generate_landscape(first, seed=5, use_cache=False)
+    generate_landscape(second, seed=5, use_cache=False)
+
+    assert (first.tiles == second.tiles).all()
+    assert (first.artefact_tiles == second.artefact_tiles).all()
+
+
+def test_stages_are_timed():
+    stages = generate_landscape(make_landscape(), seed=5, use_cache=False)
+
+    assert stages.progress == 1.0
+    assert "painted_tiles" in stages.timings
+
+
+def test_generation_doesnt_need_sections():
+    # generate_worlds.py's workers only import this much, which mustn't bring in the sections or pygame with them
+    imported = subprocess.run(
+        [sys.executable, "-c", "import sys, landscape_generation; print('sections.section' in sys.modules, 'pygame' in sys.modules)"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True)
+    assert imported.stdout.split() == ["False", "False"]
@@ -0,0 +1,91 @@
+import numpy as np
+
+import tile_types
+from pathfinding.cost_map import CostMap
+from pathfinding.hierarchical import HierarchicalPathfinder
+from pathfinding.path_requests import PathRequestQueue
+
+
+class FakeGraph:
+    """ Stands in for a HierarchicalPathfinder, every unit of work and every search takes a millisecond of a fake clock """
+    def __init__(self, dirty: int, stale: int = 0):
+        self.now = 0.0
+        self.dirty, self.stale = dirty, stale
+        self.units = 0
+        self.paths_found_while_dirty = 0
+
+    def clock(self):
+        return self.now
+
+    def rebuild_next(self, stale):
+        if self.dirty:
+            self.dirty -= 1
+        elif stale and self.stale:
+            self.stale -= 1
+        else:
+            return False
+
+        self.now += 0.001
+        self.units += 1
+        return True
+
+    def find_path(self, start, goal):
+        if self.dirty:
+            self.paths_found_while_dirty += 1
+        self.now += 0.001
+        self.units += 1
+        return [goal]
+
+    def queue(self, budget_ms):
+        return PathRequestQueue(self.find_path, budget_ms, self.rebuild_next, self.clock)
+
+
+def units_per_service(graph, queue):
+    units = []
+    while queue or graph.dirty or graph.stale:
+        before = graph.units
+        queue.service()
+        units.append(graph.units - before)
+    return units
+
+
+def test_service_stays_within_its_budget_while_clusters_are_dirty():
+    graph = FakeGraph(dirty=10)
+    queue = graph.queue(budget_ms=3)
+    futures = [queue.request((0, 0), (goal, 0)) for goal in range(4)]
+
+    # Three units fit in each frame, the requests wait for the rebuild to finish
+    assert units_per_service(graph, queue) == [3, 3, 3, 3, 2]
+    assert graph.paths_found_while_dirty == 0
+    assert [future.result() for future in futures] == [[(goal, 0)] for goal in range(4)]
+
+
+def test_one_unit_is_always_done():
+    graph = FakeGraph(dirty=3)
+    queue = graph.queue(budget_ms=0)
+    future = queue.request((0, 0), (1, 0))
+
+    assert units_per_service(graph, queue) == [1, 1, 1, 1]
+    assert future.done()
+
+
+def test_stale_clusters_get_whats_left_after_requests():
+    graph = FakeGraph(dirty=1, stale=5)
+    queue = graph.queue(budget_ms=4)
+    queue.request((0, 0), (1, 0))
+    queue.request((0, 0), (2, 0))
+
+    queue.service()
+    assert (graph.dirty, len(queue), graph.stale) == (0, 0, 4)
+
+
+def test_rebuilds_a_real_pathfinder():
+    cost_map = CostMap(np.full((64, 64), fill_value=tile_types.floor, order="F"))
+    # Nothing built yet, every cluster is dirty
+    pathfinder = HierarchicalPathfinder(cost_map)
+    queue = PathRequestQueue(pathfinder.find_path, 1000, pathfinder.rebuild_next)
+    future = queue.request((2, 2), (60, 60))
+
+    queue.service()
+    assert future.result()[-1] == (60, 60)
+    assert not pathfinder.dirty_clusters and not pathfinder.stale_clusters
@@ -0,0 +1,61 @@
+import numpy as np
+
+from utils.regions import Regions, colour_mask, neighbour_count
+
+# Three regions: an L in the top left, a single tile, and a bar along the bottom.
+# The single tile only touches the L diagonally, which doesn't join them.
+mask = np.array([
+    [1, 1, 0, 0, 0],
+    [1, 0, 1, 0, 0],
+    [1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0],
+    [0, 1, 1, 1, 1],
+], dtype=bool)
+
+
+def test_labels_and_sizes():
+    regions = Regions(mask)
+    assert regions.count == 3
+
+    l_shape, single, bar = regions.label_at(0, 0), regions.label_at(1, 2), regions.label_at(4, 1)
+    assert sorted([l_shape, single, bar]) == [1, 2, 3]
+    assert regions.label_at(3, 3) == 0
+    assert all(regions.label_at(x, y) == l_shape for x, y in ((0, 1), (1, 0), (2, 0)))
+    assert all(regions.label_at(4, y) == bar for y in range(1, 5))
+
+    assert regions.sizes[[0, l_shape, single, bar]].tolist() == [25 - 9, 4, 1, 4]
+    expected = np.zeros_like(mask)
+    expected[1, 2] = True
+    assert np.array_equal(regions.region_mask(single), expected)
+
+
+def test_bounding_boxes():
+    regions = Regions(mask)
+    boxes = {label: regions.bounding_boxes[label - 1] for label in range(1, regions.count + 1)}
+
+    assert boxes[regions.label_at(0, 0)] == (slice(0, 3), slice(0, 2))
+    assert boxes[regions.label_at(1, 2)] == (slice(1, 2), slice(2, 3))
+    assert boxes[regions.label_at(4, 1)] == (slice(4, 5), slice(1, 5))
+
+
+def test_region_points():
+    regions = Regions(mask)
+
+    assert sorted(map(tuple, regions.region_points(regions.label_at(0, 0)).tolist())) == [(0, 0), (0, 1), (1, 0), (2, 0)]
+    assert regions.region_points(regions.label_at(1, 2)).tolist() == [[1, 2]]
+    assert sorted(map(tuple, regions.region_points(regions.label_at(4, 1)).tolist())) == [(4, 1), (4, 2), (4, 3), (4, 4)]
+
+
+def test_diagonal_structure_joins_corners():
+    regions = Regions(mask, structure=np.ones((3, 3)))
+    assert regions.count == 2
+    assert regions.label_at(0, 0) == regions.label_at(1, 2)
+
+
+def test_colour_mask_and_neighbour_count():
+    colours = np.zeros((2, 2, 3), dtype=np.uint8)
+    colours[1, 0] = (10, 20, 30)
+    assert colour_mask(colours, (10, 20, 30)).tolist() == [[False, False], [True, False]]
+
+    assert neighbour_count(mask)[1, 1].tolist() == 5
+    assert neighbour_count(mask)[0, 0].tolist() == 2
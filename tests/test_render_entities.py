@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pygame")
+
+import tcod
+
+from entities.entity import Prop
+from entities.entity_store import EntityStore
+from sections.test_map_section import TestMapSection
+
+
+def render(store):
+    section = SimpleNamespace(entity_store=store, map_render_x=0, map_render_y=0, map_render_width=8, map_render_height=8, map_x_offset=0, map_y_offset=0)
+    console = tcod.Console(8, 8, order="F")
+    TestMapSection.render_entities(section, console)
+    return chr(console.tiles_rgb["ch"][2, 3])
+
+
+def test_ties_keep_their_order_when_an_entity_is_removed():
+    store = EntityStore()
+    first, second, third = (Prop(x=2, y=3, char=char) for char in "abc")
+    for prop in (first, second, third):
+        store.add(prop)
+    assert render(store) == "c"
+
+    # Removing the first moves the third into its row, it still draws on top of the second
+    store.remove(first)
+    assert third.row == 0
+    assert render(store) == "c"
+
+    store.add(first)
+    assert render(store) == "a"
@@ -0,0 +1,32 @@
+import numpy as np
+
+import utils.color
+import utils.rng
+
+
+def gameplay_draws():
+    # The wear roll MovementAction makes, an effect's timing and a random colour
+    return (utils.rng.stream("gameplay", "wear").random(5).tolist(),
+            utils.rng.stream("effects").integers(100, size=5).tolist(),
+            utils.color.get_random_color())
+
+
+def test_same_seed_same_gameplay():
+    utils.rng.seed_streams(1237)
+    first = gameplay_draws()
+
+    np.random.seed(99)
+    utils.rng.seed_streams(1237)
+    assert gameplay_draws() == first
+
+    utils.rng.seed_streams(1238)
+    assert gameplay_draws() != first
+
+
+def test_streams_dont_shift_each_other():
+    utils.rng.seed_streams(5)
+    effects = utils.rng.stream("effects").random(3).tolist()
+
+    utils.rng.seed_streams(5)
+    utils.rng.stream("gameplay", "wear").random(10)
+    assert utils.rng.stream("effects").random(3).tolist() == effects
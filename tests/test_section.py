@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("pygame")
+
+from entities.entity import Prop
+from entities.entity_store import EntityStore
+from sections.section import Section
+
+
+def test_entities_loaded_with_the_section_are_stored(monkeypatch):
+    prop = Prop(x=3, y=4)
+
+    def load_entities(section, data_name, xp_data):
+        section.add_entity(prop)
+
+    monkeypatch.setattr(Section, "load_entities", load_entities)
+    store = EntityStore()
+    section = Section(None, 0, 0, 10, 10, entity_store=store)
+
+    assert section.entity_store is store
+    assert prop.store is store and store.entities == [prop]
+    assert (store.x[prop.row], store.y[prop.row]) == (3, 4)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import tile_types
+from terrain_layer import TerrainLayer
+
+view_width, view_height = 10, 6
+
+
+def make_tiles(width=40, height=30):
+    tiles = np.full((width, height), fill_value=tile_types.floor, order="F")
+    # Every tile a different character, so anything copied from the wrong place shows up
+    tiles["graphic"]["ch"] = np.arange(width * height).reshape(width, height)
+    return tiles
+
+
+def expected(tiles, x, y):
+    return tiles[x:x + view_width, y:y + view_height]["graphic"]
+
+
+@pytest.mark.parametrize("dx, dy", [(3, 0), (-3, 0), (0, 2), (0, -2), (4, 3), (-4, -3), (4, -3), (-4, 3), (1, 1)])
+def test_scrolling_matches_a_fresh_read(dx, dy):
+    tiles = make_tiles()
+    layer = TerrainLayer()
+    x, y = 15, 12
+    layer.draw(tiles, x, y, view_width, view_height)
+
+    for _ in range(3):
+        x, y = x + dx, y + dy
+        graphic = layer.draw(tiles, x, y, view_width, view_height)
+        assert np.array_equal(graphic, expected(tiles, x, y))
+
+
+def test_scrolling_keeps_what_is_still_on_screen():
+    tiles = make_tiles()
+    layer = TerrainLayer()
+    first = layer.draw(tiles, 15, 12, view_width, view_height)
+
+    # Changing a tile that stays on screen without marking it dirty isn't picked up, so it was shifted rather than re-read
+    tiles["graphic"]["ch"][20, 14] = ord("@")
+    graphic = layer.draw(tiles, 16, 12, view_width, view_height)
+    assert graphic is first
+    assert graphic[4, 2]["ch"] != ord("@")
+
+
+def test_dirty_tiles_are_redrawn():
+    tiles = make_tiles()
+    layer = TerrainLayer()
+    layer.draw(tiles, 15, 12, view_width, view_height)
+
+    tiles["graphic"]["ch"][16:19, 13] = ord("#")
+    tiles["graphic"]["ch"][30, 20] = ord("#")
+    layer.mark_dirty(16, 13, 3, 1)
+    # Off screen, nothing to copy
+    layer.mark_dirty(30, 20)
+    assert np.array_equal(layer.draw(tiles, 15, 12, view_width, view_height), expected(tiles, 15, 12))
+
+    # Dirty and scrolled in the same frame
+    tiles["graphic"]["ch"][14, 12] = ord("%")
+    layer.mark_dirty(14, 12)
+    assert np.array_equal(layer.draw(tiles, 13, 11, view_width, view_height), expected(tiles, 13, 11))
+
+
+def test_big_jumps_and_new_tiles_read_everything():
+    tiles = make_tiles()
+    layer = TerrainLayer()
+    layer.draw(tiles, 0, 0, view_width, view_height)
+
+    assert np.array_equal(layer.draw(tiles, 25, 20, view_width, view_height), expected(tiles, 25, 20))
+    other = make_tiles()
+    other["graphic"]["ch"] += 1
+    assert np.array_equal(layer.draw(other, 25, 20, view_width, view_height), expected(other, 25, 20))
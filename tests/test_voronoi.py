@@ -0,0 +1,79 @@
+import numpy as np
+import tcod.los
+
+from utils.voronoi import Voronoi
+
+width, height = 60, 40
+
+
+def make_voronoi(seed=3):
+    return Voronoi(12, np.array([-1, width + 1, -1, height + 1]), np.random.default_rng(seed))
+
+
+def test_edge_mask_matches_bresenham():
+    voronoi = make_voronoi()
+    assert len(voronoi.vor.filtered_regions) > 0
+
+    # What drawing each edge with tcod.los.bresenham, one at a time, gives
+    expected = np.zeros((width, height), dtype=bool)
+    for region in voronoi.vor.filtered_regions:
+        vertices = voronoi.vor.vertices[region]
+        for i in range(len(vertices)):
+            start, end = vertices[i], vertices[(i + 1) % len(vertices)]
+            for x, y in tcod.los.bresenham((int(start[0]), int(start[1])), (int(end[0]), int(end[1]))).tolist():
+                if 0 <= x < width and 0 <= y < height:
+                    expected[x, y] = True
+
+    assert np.array_equal(voronoi.edge_mask(width, height), expected)
+
+
+def test_edge_mask_lines_in_every_direction():
+    voronoi = make_voronoi()
+    ends = [(0, 0), (9, 3), (3, 9), (-9, 3), (3, -9), (-9, -3), (-3, -9), (9, -3), (-3, 9), (6, 6), (-6, 6), (7, 0), (0, -7)]
+    voronoi.polygon_edges = lambda: (np.full((len(ends), 2), 20.0), np.array(ends, dtype=float) + 20)
+
+    expected = np.zeros((width, height), dtype=bool)
+    for x, y in ends:
+        expected[tuple(tcod.los.bresenham((20, 20), (x + 20, y + 20)).T)] = True
+
+    assert np.array_equal(voronoi.edge_mask(width, height), expected)
+
+
+def test_labels_are_the_nearest_tower():
+    voronoi = make_voronoi()
+    towers = voronoi.vor.filtered_points
+    labels = voronoi.nearest_tower_labels(width, height)
+
+    xs, ys = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+    distances = (xs[..., np.newaxis] - towers[:, 0]) ** 2 + (ys[..., np.newaxis] - towers[:, 1]) ** 2
+    # Ties can go either way, the label just has to be one of the nearest
+    assert (np.take_along_axis(distances, labels[..., np.newaxis], axis=2)[..., 0] == distances.min(axis=2)).all()
+
+
+def shoelace_centroid(vertices):
+    area, cx, cy = 0.0, 0.0, 0.0
+    for (x0, y0), (x1, y1) in zip(vertices, vertices[1:] + vertices[:1]):
+        cross = x0 * y1 - x1 * y0
+        area += cross / 2
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    return cx / (6 * area), cy / (6 * area)
+
+
+def test_centroid_region_of_a_simple_polygon():
+    voronoi = make_voronoi()
+    # An L shape, its centroid isn't the middle of its bounding box
+    l_shape = [(0, 0), (6, 0), (6, 2), (2, 2), (2, 8), (0, 8)]
+    expected = shoelace_centroid(l_shape)
+
+    assert voronoi.centroid_region(np.array(l_shape + l_shape[:1], dtype=float)) == [int(expected[0]), int(expected[1])]
+    assert voronoi.centroid_region(np.array([(0, 0), (0, 4), (4, 4), (4, 0), (0, 0)], dtype=float)) == [2, 2]
+
+
+def test_centroids_match_shoelace():
+    voronoi = make_voronoi()
+    centroids = voronoi.centroids()
+
+    for region, centroid in zip(voronoi.vor.filtered_regions, centroids):
+        expected = shoelace_centroid([tuple(vertex) for vertex in voronoi.vor.vertices[region]])
+        assert np.allclose(centroid, expected)
@@ -0,0 +1,105 @@
+import glob
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import xp_loader
+
+images_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+xp_path = os.path.join(images_dir, "notification_dialog.xp")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(xp_loader, "xp_cache_dir", str(tmp_path / "xp"))
+    return tmp_path / "xp"
+
+
+def decode_cell_by_cell(layer_string):
+    """ What parse_layer did before it was vectorised: x major, a cell at a time through parse_individual_cell """
+    width = int.from_bytes(layer_string[:4], "little")
+    height = int.from_bytes(layer_string[4:8], "little")
+    cells, offset = [], 8
+    for x in range(width):
+        column = []
+        for y in range(height):
+            column.append(xp_loader.parse_individual_cell(layer_string[offset:offset + xp_loader.layer_cell_bytes]))
+            offset += xp_loader.layer_cell_bytes
+        cells.append(column)
+    return cells
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(images_dir, "*.xp"))), ids=os.path.basename)
+def test_array_parser_matches_cell_by_cell(path):
+    file_string = gzip.decompress(open(path, "rb").read())
+    header = xp_loader.read_xp_header(file_string)
+    xp_data = xp_loader.load_xp_array(file_string)
+
+    for layer, ((width, height), offset) in zip(xp_data["layer_data"], zip(header["layer_sizes"], header["layer_offsets"])):
+        cells = decode_cell_by_cell(file_string[offset:offset + 8 + xp_loader.layer_cell_bytes * width * height])
+        graphic = layer["graphic"]
+        assert graphic.shape == (width, height)
+
+        for x in range(width):
+            for y in range(height):
+                ch, fg, bg = cells[x][y]
+                assert (graphic["ch"][x, y], tuple(graphic["fg"][x, y]), tuple(graphic["bg"][x, y])) == (ch, fg, bg)
+
+        # Transparent cells keep REXPaint's key colour as their bg, same as before
+        transparent = [(x, y) for x in range(width) for y in range(height) if cells[x][y][2] == (255, 0, 255)]
+        assert transparent and all(tuple(graphic["bg"][x, y]) == (255, 0, 255) for x, y in transparent)
+
+
+def uncached(path):
+    return xp_loader.load_xp_file(path, use_cache=False)["layer_data"][0]["graphic"]
+
+
+def test_second_load_comes_from_the_cache(cache_dir):
+    first = xp_loader.load_xp_file(xp_path)["layer_data"][0]["graphic"]
+    assert len(list(cache_dir.glob("*.npy"))) == 1
+
+    second = xp_loader.load_xp_file(xp_path)["layer_data"][0]["graphic"]
+    assert isinstance(second, np.memmap)
+    assert np.array_equal(first, uncached(xp_path)) and np.array_equal(second, first)
+
+
+def test_changed_file_gets_a_new_entry(cache_dir, tmp_path):
+    path = str(tmp_path / "changed.xp")
+    shutil.copy(xp_path, path)
+    xp_loader.load_xp_file(path)
+
+    # Same layout, one cell different
+    data = bytearray(gzip.decompress(open(path, "rb").read()))
+    cell = xp_loader.read_xp_header(bytes(data))["layer_offsets"][0] + xp_loader.layer_width_bytes + xp_loader.layer_height_bytes
+    data[cell] = ord("@")
+    with open(path, "wb") as f:
+        f.write(gzip.compress(bytes(data)))
+
+    graphic = xp_loader.load_xp_file(path)["layer_data"][0]["graphic"]
+    assert graphic[0, 0]["ch"] == ord("@")
+    assert np.array_equal(graphic, uncached(path))
+    assert len(list(cache_dir.glob("*.npy"))) == 2
+
+
+@pytest.mark.parametrize("keep", [0, 10, 200])
+def test_truncated_layer_is_rebuilt(cache_dir, keep):
+    expected = uncached(xp_path)
+    xp_loader.load_xp_file(xp_path)
+    layer_path, = cache_dir.glob("*.npy")
+    with open(layer_path, "r+b") as f:
+        f.truncate(keep)
+
+    assert np.array_equal(xp_loader.load_xp_file(xp_path)["layer_data"][0]["graphic"], expected)
+    # And written back whole
+    assert np.array_equal(np.load(layer_path, allow_pickle=False), expected)
+
+
+def test_failing_to_write_warns(cache_dir):
+    # A file where the cache directory should be
+    cache_dir.write_text("")
+    with pytest.warns(RuntimeWarning, match="Couldn't write xp cache file"):
+        graphic = xp_loader.load_xp_file(xp_path)["layer_data"][0]["graphic"]
+    assert np.array_equal(graphic, uncached(xp_path))
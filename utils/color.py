@@ -1,7 +1,9 @@
 
-import random
 from typing import Tuple
 
+import utils.color_array
+import utils.rng
+
 GRASS_GREEN = (17, 41, 6)
 DARK_GREEN = (40, 50, 6)
 LIGHT_HEDGE = (30, 40, 0)
@@ -41,15 +43,10 @@ colors.append(blue)
 colors.append(yellow)
 
 def get_random_color():
-    return colors[random.randrange(0, len(colors))]
+    return colors[utils.rng.stream("gameplay").integers(len(colors))]
 
 def blend_color(self, lc, rc, t):
-        r = lc[0] * t + rc[0] * (1 - t) 
-        g = lc[1] * t + rc[1] * (1 - t) 
-        b = lc[2] * t + rc[2] * (1 - t)
-
-        return (int(r),int(g),int(b))
+        return tuple(utils.color_array.blend(lc, rc, t).tolist())
 
 def color_lerp(colour1: Tuple[int, int, int], colour2: Tuple[int, int, int], t: float) -> Tuple[int, int, int]:
-    return (int(colour1[0] + t * (colour2[0] - colour1[0])), int(colour1[1] + t * (colour2[1] - colour1[1])), int(colour1[2] + t * (colour2[2] - colour1[2])))
-
+    return tuple(utils.color_array.lerp(colour1, colour2, t).tolist())
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Colour maths over whole arrays of RGB colours.
+# Colours can be a single (r, g, b) or any (..., 3) array, they and t are broadcast against each other,
+# with t having one value per colour (so its shape is the colour shape without the last axis).
+# Results are uint8, clamped to 0-255 and then truncated the same way int() does in the tuple helpers in utils.color,
+# so a t outside 0-1 saturates rather than wrapping round.
+# Every function takes an optional out array to write into, so hot loops can reuse a buffer instead of allocating.
+
+
+def to_colour_array(colours) -> np.ndarray:
+    return np.asarray(colours, dtype=np.float64)
+
+def expand_t(t) -> np.ndarray:
+    # Give t a trailing axis so it lines up with the RGB channels
+    return np.asarray(t, dtype=np.float64)[..., np.newaxis]
+
+def lerp(colour1, colour2, t, out=None) -> np.ndarray:
+    """ colour1 at t == 0, colour2 at t == 1 """
+    colour1 = to_colour_array(colour1)
+    result = colour1 + expand_t(t) * (to_colour_array(colour2) - colour1)
+    return store(result, out)
+
+def blend(lc, rc, t, out=None) -> np.ndarray:
+    """ lc at t == 1, rc at t == 0 """
+    t = expand_t(t)
+    result = to_colour_array(lc) * t + to_colour_array(rc) * (1 - t)
+    return store(result, out)
+
+def random_lerp(colour1, colour2, shape=None, out=None, rng=np.random) -> np.ndarray:
+    """ A random point between colour1 and colour2 for each colour in shape (or out's shape), drawn from rng """
+    if shape is None:
+        shape = out.shape[:-1] if out is not None else ()
+    return lerp(colour1, colour2, rng.random(shape), out)
+
+def store(result, out) -> np.ndarray:
+    # Casting wraps (and is platform dependent for negatives), so clamp first
+    result = np.clip(result, 0, 255, out=result)
+    if out is None:
+        return result.astype(np.uint8)
+
+    np.copyto(out, result, casting="unsafe")
+    return out
@@ -0,0 +1,47 @@
+import numpy as np
+import scipy.ndimage
+
+# 4-connected neighbourhood used for flood fills, tiles only join through their edges
+von_neumann_structure = np.array([[0, 1, 0],
+                                  [1, 1, 1],
+                                  [0, 1, 0]])
+
+# All 8 surrounding tiles, centre excluded
+moore_kernel = np.array([[1, 1, 1],
+                         [1, 0, 1],
+                         [1, 1, 1]], dtype=np.uint8)
+
+
+class Regions:
+    """ Connected-component labelling of a boolean mask, done in a single pass.
+    labels has 0 for tiles outside the mask and 1..count for each connected region.
+    sizes[label] is the number of tiles in a region (sizes[0] counts everything outside the mask),
+    bounding_boxes[label - 1] is a (slice, slice) tuple covering the region, ready to index an array with. """
+    def __init__(self, mask, structure=von_neumann_structure):
+        self.labels, self.count = scipy.ndimage.label(mask, structure=structure)
+        self.sizes = np.bincount(self.labels.ravel(), minlength=self.count + 1)
+        self.bounding_boxes = scipy.ndimage.find_objects(self.labels)
+
+    def label_at(self, x, y) -> int:
+        return int(self.labels[x, y])
+
+    def region_mask(self, label) -> np.ndarray:
+        return self.labels == label
+
+    def region_points(self, label) -> np.ndarray:
+        """ (n, 2) array of the x, y of every tile in a region """
+        bounding_box = self.bounding_boxes[label - 1]
+        points = np.argwhere(self.labels[bounding_box] == label)
+        points[:, 0] += bounding_box[0].start
+        points[:, 1] += bounding_box[1].start
+
+        return points
+
+
+def colour_mask(colours, colour) -> np.ndarray:
+    """ True wherever a (..., 3) colour array exactly matches colour """
+    return np.all(colours == np.asarray(colour, dtype=colours.dtype), axis=-1)
+
+def neighbour_count(mask) -> np.ndarray:
+    """ How many of each tile's 8 neighbours are in the mask, tiles off the edge of the map don't count """
+    return scipy.ndimage.convolve(mask.astype(np.uint8), moore_kernel, mode="constant", cval=0)
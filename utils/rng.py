@@ -0,0 +1,48 @@
+import zlib
+
+import numpy as np
+
+# Named random streams, all derived from one root seed.
+# Each stream is its own numpy Generator, so what one subsystem draws never shifts what another one sees,
+# and a stream comes out the same no matter which order (or which process or thread) the streams are used in.
+
+
+class RandomStreams:
+    """ streams.stream("effects") gives the same Generator every time it's asked for,
+    streams.child("chunk", 3, 4) gives a whole new set of streams derived from this one, e.g. for one chunk of a map. """
+    def __init__(self, root_seed=None, seed_sequence=None):
+        self.seed_sequence = seed_sequence if seed_sequence is not None else np.random.SeedSequence(root_seed)
+        self.streams = {}
+
+    @property
+    def root_seed(self):
+        return self.seed_sequence.entropy
+
+    def stream(self, *name) -> np.random.Generator:
+        if name not in self.streams:
+            self.streams[name] = np.random.default_rng(self.derive(name))
+        return self.streams[name]
+
+    def child(self, *name) -> "RandomStreams":
+        return RandomStreams(seed_sequence=self.derive(name))
+
+    def derive(self, name) -> np.random.SeedSequence:
+        return np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=self.seed_sequence.spawn_key + name_key(name))
+
+
+def name_key(name):
+    # Stream names can mix strings and non-negative ints, strings are hashed with crc32 as Python's own hash changes between runs
+    return tuple(part if isinstance(part, int) and part >= 0 else zlib.crc32(str(part).encode()) for part in name)
+
+
+# Streams for the running game, gameplay, effects and the like. Unseeded until seed_streams is called,
+# which the map section does with its world seed, so a run can be replayed from the seed alone.
+streams = RandomStreams()
+
+def seed_streams(root_seed):
+    """ Starts every stream afresh from root_seed """
+    global streams
+    streams = RandomStreams(root_seed)
+
+def stream(*name) -> np.random.Generator:
+    return streams.stream(*name)
@@ -9,12 +9,12 @@ eps = sys.float_info.epsilon
 
 
 class Voronoi:
-    def __init__(self, n_towers, bounding_box):
+    def __init__(self, n_towers, bounding_box, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+
         # Select towers inside the bounding box
-        towers = np.zeros((n_towers, 2), dtype=int)
-        for i in range(0, n_towers):
-            towers[i][0] = np.random.randint(0, bounding_box[1] - 1)
-            towers[i][1] = np.random.randint(0, bounding_box[3] - 1)
+        towers = rng.integers(0, [bounding_box[1] - 1, bounding_box[3] - 1], size=(n_towers, 2))
         i = self.in_box(towers, bounding_box)
         # Mirror points
         points_center = towers[i, :]
@@ -37,25 +37,101 @@ class Voronoi:
                            axis=0)
         # Compute Voronoi
         self.vor = sp.spatial.Voronoi(points)
-        # Filter regions
-        regions = []
-        for region in self.vor.regions:
-            flag = True
-            for index in region:
-                if index == -1:
-                    flag = False
-                    break
-                else:
-                    x = self.vor.vertices[index, 0]
-                    y = self.vor.vertices[index, 1]
-                    if not(bounding_box[0] - eps <= x and x <= bounding_box[1] + eps and
-                           bounding_box[2] - eps <= y and y <= bounding_box[3] + eps):
-                        flag = False
-                        break
-            if region != [] and flag:
-                regions.append(region)
         self.vor.filtered_points = points_center
-        self.vor.filtered_regions = regions
+        self.vor.filtered_regions = self.filter_regions(bounding_box)
+
+    def filter_regions(self, bounding_box):
+        # Keep the regions that are closed and have every vertex inside the bounding box
+        regions = [region for region in self.vor.regions if len(region) > 0]
+        if len(regions) == 0:
+            return []
+
+        vertices = self.vor.vertices
+        inside = ((bounding_box[0] - eps <= vertices[:, 0]) & (vertices[:, 0] <= bounding_box[1] + eps) &
+                  (bounding_box[2] - eps <= vertices[:, 1]) & (vertices[:, 1] <= bounding_box[3] + eps))
+        # An index of -1 (vertex at infinity) picks up this trailing False
+        inside = np.append(inside, False)
+
+        indices, starts = self.flatten_regions(regions)
+        keep = np.logical_and.reduceat(inside[indices], starts)
+
+        return [region for region, kept in zip(regions, keep) if kept]
+
+    def flatten_regions(self, regions):
+        """ All the vertex indices of regions in one array, plus where each region starts in it """
+        lengths = np.array([len(region) for region in regions])
+        starts = np.zeros(len(regions), dtype=int)
+        starts[1:] = np.cumsum(lengths)[:-1]
+
+        return np.concatenate(regions), starts
+
+    def polygon_edges(self):
+        """ Start and end vertices of every edge of every filtered region, as two (n, 2) arrays """
+        if len(self.vor.filtered_regions) == 0:
+            return np.empty((0, 2)), np.empty((0, 2))
+
+        indices, starts = self.flatten_regions(self.vor.filtered_regions)
+        # Each vertex joins the next one in its region, and the last joins back to the first
+        next_indices = np.roll(indices, -1)
+        ends = np.append(starts[1:], len(indices)) - 1
+        next_indices[ends] = indices[starts]
+
+        return self.vor.vertices[indices], self.vor.vertices[next_indices]
+
+    def edge_mask(self, width, height) -> np.ndarray:
+        """ (width, height) mask with every region edge rasterized, anything outside the map is clipped.
+        The same tiles tcod.los.bresenham gives for each edge, worked out for every point of every line at once. """
+        start, end = self.polygon_edges()
+        start = start.astype(int)
+        end = end.astype(int)
+
+        delta = end - start
+        sign = np.sign(delta)
+        length = np.abs(delta)
+        # Bresenham steps one tile along the major axis every step, and along the minor axis whenever its error goes negative
+        x_major = length[:, 0] > length[:, 1]
+        major = np.where(x_major, length[:, 0], length[:, 1])
+        minor = np.where(x_major, length[:, 1], length[:, 0])
+        counts = major + 1
+
+        # One row per point on every line, k is how far along its own line each point is
+        line = np.repeat(np.arange(len(start)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        major_line, minor_line = major[line], minor[line]
+        # How many minor steps have been taken after k major ones, ceil((2 * k * minor - major) / (2 * major)) and never negative
+        minor_k = np.maximum(0, -((major_line - 2 * k * minor_line) // np.maximum(2 * major_line, 1)))
+        x = start[line, 0] + sign[line, 0] * np.where(x_major[line], k, minor_k)
+        y = start[line, 1] + sign[line, 1] * np.where(x_major[line], minor_k, k)
+
+        on_map = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        mask = np.zeros((width, height), dtype=bool)
+        mask[x[on_map], y[on_map]] = True
+
+        return mask
+
+    def centroids(self) -> np.ndarray:
+        """ (n, 2) centroid of every filtered region, in the same order as filtered_regions """
+        if len(self.vor.filtered_regions) == 0:
+            return np.empty((0, 2))
+
+        start, end = self.polygon_edges()
+        _, starts = self.flatten_regions(self.vor.filtered_regions)
+
+        s = start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]
+        A = 0.5 * np.add.reduceat(s, starts)
+        C_x = np.add.reduceat((start[:, 0] + end[:, 0]) * s, starts) / (6.0 * A)
+        C_y = np.add.reduceat((start[:, 1] + end[:, 1]) * s, starts) / (6.0 * A)
+
+        return np.column_stack((C_x, C_y))
+
+    def nearest_tower_labels(self, width, height) -> np.ndarray:
+        """ (width, height) map of the index into filtered_points of the tower closest to each tile """
+        # Mirrored points are always further away than the tower they mirror for any tile in the box, so only the real towers are needed
+        tree = sp.spatial.cKDTree(self.vor.filtered_points)
+        xs, ys = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+        _, labels = tree.query(np.column_stack((xs.ravel(), ys.ravel())))
+
+        return labels.reshape(width, height)
 
     def in_box(self, towers, bounding_box):
         return np.logical_and(np.logical_and(bounding_box[0] <= towers[:, 0],
@@ -64,20 +140,14 @@ class Voronoi:
                                              towers[:, 1] <= bounding_box[3]))
 
     def centroid_region(self, vertices) -> Tuple[int, int]:
+        # vertices is a closed polygon, its last vertex repeating the first
+        s = vertices[:-1, 0] * vertices[1:, 1] - vertices[1:, 0] * vertices[:-1, 1]
         # Polygon's signed area
-        A = 0
+        A = 0.5 * s.sum()
         # Centroid's x
-        C_x = 0
+        C_x = (1.0 / (6.0 * A)) * ((vertices[:-1, 0] + vertices[1:, 0]) * s).sum()
         # Centroid's y
-        C_y = 0
-        for i in range(0, len(vertices) - 1):
-            s = (vertices[i, 0] * vertices[i + 1, 1] - vertices[i + 1, 0] * vertices[i, 1])
-            A = A + s
-            C_x = C_x + (vertices[i, 0] + vertices[i + 1, 0]) * s
-            C_y = C_y + (vertices[i, 1] + vertices[i + 1, 1]) * s
-        A = 0.5 * A
-        C_x = (1.0 / (6.0 * A)) * C_x
-        C_y = (1.0 / (6.0 * A)) * C_y
+        C_y = (1.0 / (6.0 * A)) * ((vertices[:-1, 1] + vertices[1:, 1]) * s).sum()
         return [int(C_x), int(C_y)]
 
 
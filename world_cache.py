@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+import numpy as np
+import tcod
+
+from application_path import get_cache_path
+
+##################################
+# On-disk cache of finished landscapes.
+# A world is keyed by everything that goes into generating it: the seed, the map size, the generation parameters,
+# the contents of the painted .xp grids and the tcod version (its noise feeds the generator).
+# tiles and artefact_tiles are stored side by side in one structured .npy, so a cache hit is a single memory map.
+# Bump world_cache_format whenever the generator itself changes, so old worlds are ignored and regenerated.
+##################################
+
+world_cache_dir = os.path.join(get_cache_path(), "worlds")
+world_cache_format = 4
+
+
+def get_world_key(seed, width, height, parameters, input_files):
+    key = hashlib.sha1()
+    key.update(json.dumps({
+        'format':world_cache_format,
+        'tcod':tcod.__version__,
+        'seed':seed,
+        'width':width,
+        'height':height,
+        'parameters':parameters,
+    }, sort_keys=True).encode())
+
+    for input_file in input_files:
+        if os.path.isfile(input_file):
+            with open(input_file, "rb") as f:
+                key.update(hashlib.sha1(f.read()).digest())
+        else:
+            key.update(b"missing")
+
+    return key.hexdigest()
+
+def get_world_path(world_key):
+    return os.path.join(world_cache_dir, world_key + ".npy")
+
+##################################
+# Returns (tiles, artefact_tiles) or None if this world hasn't been cached yet.
+# The arrays are copy-on-write memory maps, so the game can change tiles freely without touching the file.
+##################################
+
+def load_world(world_key):
+    try:
+        world = np.load(get_world_path(world_key), mmap_mode="c", allow_pickle=False)
+        return world["tiles"], world["artefact_tiles"]
+    except (OSError, ValueError, EOFError, KeyError):
+        return None
+
+def save_world(world_key, tiles, artefact_tiles):
+    world = np.empty(tiles.shape, dtype=[("tiles", tiles.dtype), ("artefact_tiles", artefact_tiles.dtype)], order="F")
+    world["tiles"] = tiles
+    world["artefact_tiles"] = artefact_tiles
+
+    # Written to a temporary file of its own first, so other processes saving the same world can't clash with it
+    path = get_world_path(world_key)
+    temp_path = None
+    try:
+        os.makedirs(world_cache_dir, exist_ok=True)
+        temp_file, temp_path = tempfile.mkstemp(dir=world_cache_dir, prefix=world_key + ".", suffix=".tmp")
+        with os.fdopen(temp_file, "wb") as f:
+            np.save(f, world, allow_pickle=False)
+        os.replace(temp_path, path)
+        temp_path = None
+    except OSError as e:
+        # Another process finishing the same world first is fine, its copy is just as good
+        if not os.path.isfile(path):
+            warnings.warn("Couldn't write world cache file " + path + ": " + str(e), RuntimeWarning)
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
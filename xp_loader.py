@@ -1,7 +1,14 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import warnings
 from typing import Tuple
 import numpy as np
 import tcod
 
+from application_path import get_cache_path
 from tile_types import graphic_dt, tile_dt
 
 ##################################
@@ -13,6 +20,10 @@ from tile_types import graphic_dt, tile_dt
 ## layer_data is a list of individual layers, which are stored in the following format
 ### Each layer is a dictionary with keys width, height (see above), and cells. 
 ### Cells is a row major 2d array of, again, dictionaries with the values 'keycode' (ascii keycode), 'fore_r/g/b', and 'back_r/g/b' (technically ints but in value 0-255)
+#
+# load_xp_array returns the same top level dictionary, but each layer holds a 'graphic' key instead of 'cells'.
+## graphic is a (width, height) numpy array of tile_types.graphic_dt, indexed [x, y] just like the file stores it,
+## with the keycodes already mapped through cp437 so it can be assigned straight into a tiles["graphic"] slice.
 ##################################
 
 cp437 = np.array(
@@ -66,8 +77,26 @@ layer_fore_rgb_bytes = 3
 layer_back_rgb_bytes = 3
 layer_cell_bytes = layer_keycode_bytes + layer_fore_rgb_bytes + layer_back_rgb_bytes
 
+# On-disk layout of a single cell, always little-endian regardless of the machine we're running on
+xp_cell_dt = np.dtype(
+	[
+		("keycode", "<u4"),
+		("fore", "3u1"),
+		("back", "3u1"),
+	]
+)
 
 
+
+##################################
+# Compiled asset cache. Parsed layers are written out as .npy files named after a hash of the gzipped .xp file,
+# so a changed file gets a new entry and later loads just memory-map the arrays instead of gunzipping and parsing.
+# Bump xp_cache_format if the array layout ever changes, so old entries are ignored and rebuilt.
+##################################
+
+xp_cache_dir = os.path.join(get_cache_path(), "xp")
+xp_cache_format = 2
+
 ##################################
 # REXPaint color key for transparent background colors. Not directly used here, but you should reference this when calling libtcod's console_set_key_color on offscreen consoles.
 ##################################
@@ -137,107 +166,281 @@ def get_position_key_xy(xp_file_layer, poskey_color):
 
 
 ##################################
-# loads in an xp file from an unzipped string (gained from opening a .xp file with gzip and calling .read())
-# reverse_endian controls whether the slices containing data for things like layer width, height, number of layers, etc. is reversed 
-# so far as I can tell Python is doing int conversions in big-endian, while the .xp format stores them in little-endian
-# I may just not be aware of it being unneeded, but have it there in case
+# Reads the file and layer headers only, using the same lookahead as before to find where each layer starts.
+# Returns the top level dictionary described at the top of the file minus layer_data, plus layer_sizes and layer_offsets for each layer.
 ##################################
 
-def load_xp_string(file_string, reverse_endian=True):
-
-	offset = 0
-
-	version = file_string[offset : offset + version_bytes]
-	offset += version_bytes
-	layer_count = file_string[offset : offset + layer_count_bytes]
-	offset += layer_count_bytes
-
-	if reverse_endian:
-		version = version[::-1]
-		layer_count = layer_count[::-1]
-
-	# hex-encodes the numbers then converts them to an int
-	version = int(version.hex(), 16)
-	layer_count = int(layer_count.hex(), 16)
+def read_xp_header(file_string):
+	version, layer_count = np.frombuffer(file_string, dtype="<u4", count=2)
+	version = int(version)
+	layer_count = int(layer_count)
+	offset = version_bytes + layer_count_bytes
 
-	layers = []
+	layer_sizes = []
+	layer_offsets = []
 
 	current_largest_width = 0
 	current_largest_height = 0
 
 	for layer in range(layer_count):
-		#slight lookahead to figure out how much data to feed load_layer
-
-		this_layer_width = file_string[offset:offset + layer_width_bytes]
-		this_layer_height = file_string[offset + layer_width_bytes:offset + layer_width_bytes + layer_height_bytes]
-
-		if reverse_endian:
-			this_layer_width = this_layer_width[::-1]
-			this_layer_height = this_layer_height[::-1]
-
-		this_layer_width = int(this_layer_width.hex(), 16)
-		this_layer_height = int(this_layer_height.hex(), 16)
+		#slight lookahead to figure out how much data belongs to this layer
+		this_layer_width, this_layer_height = np.frombuffer(file_string, dtype="<u4", count=2, offset=offset)
+		this_layer_width = int(this_layer_width)
+		this_layer_height = int(this_layer_height)
 
 		current_largest_width = max(current_largest_width, this_layer_width)
 		current_largest_height = max(current_largest_height, this_layer_height)
 
-		layer_data_size = layer_width_bytes + layer_height_bytes + (layer_cell_bytes *  this_layer_width * this_layer_height)
-
-		layer_data_raw = file_string[offset:offset + layer_data_size]
-		layer_data = parse_layer(file_string[offset:offset + layer_data_size], reverse_endian)
-		layers.append(layer_data)
+		layer_sizes.append((this_layer_width, this_layer_height))
+		layer_offsets.append(offset)
 
-		offset += layer_data_size
+		offset += layer_width_bytes + layer_height_bytes + (layer_cell_bytes *  this_layer_width * this_layer_height)
 
 	return {
 		'version':version,
 		'layer_count':layer_count,
 		'width':current_largest_width,
 		'height':current_largest_height,
-		'layer_data':layers
+		'layer_sizes':layer_sizes,
+		'layer_offsets':layer_offsets
 	}
 
 ##################################
-# Takes a single layer's data and returns the format listed at the top of the file for a single layer.
+# loads in an xp file from an unzipped string (gained from opening a .xp file with gzip and calling .read())
+# Each layer is read in one go with np.frombuffer, so there is no per cell python work at all.
+# Returns the array format described at the top of the file.
+# layers is an optional collection of layer indices to decode, the others are skipped over and left as None in layer_data
+# so indices still line up with the file. With lazy set, the layers are LazyXPLayers that only decode when their graphic is first read.
 ##################################
 
-def parse_layer(layer_string, reverse_endian=True):
-	offset = 0
+def load_xp_array(file_string, layers=None, lazy=False):
+	header = read_xp_header(file_string)
 
-	width = layer_string[offset:offset + layer_width_bytes]
-	offset += layer_width_bytes
-	height = layer_string[offset:offset + layer_height_bytes]
-	offset += layer_height_bytes
+	file_view = memoryview(file_string)
+	layer_data = []
 
-	if reverse_endian:
-		width = width[::-1]
-		height = height[::-1]
+	for layer, ((width, height), offset) in enumerate(zip(header['layer_sizes'], header['layer_offsets'])):
+		if layers is not None and layer not in layers:
+			layer_data.append(None)
+			continue
 
-	width = int(width.hex(), 16)
-	height = int(height.hex(), 16)
+		layer_data_size = layer_width_bytes + layer_height_bytes + (layer_cell_bytes * width * height)
+		layer_string = file_view[offset:offset + layer_data_size]
 
-	cells = []
-	for x in range(width):
-		row = []
+		if lazy:
+			layer_data.append(LazyXPLayer(layer_string, width, height))
+		else:
+			layer_data.append(parse_layer_array(layer_string))
 
-		for y in range(height):
-			cell_data_raw = layer_string[offset:offset + layer_cell_bytes]
-			cell_data = parse_individual_cell(cell_data_raw, reverse_endian)
-			row.append(cell_data)
-			offset += layer_cell_bytes
+	return {
+		'version':header['version'],
+		'layer_count':header['layer_count'],
+		'width':header['width'],
+		'height':header['height'],
+		'layer_data':layer_data
+	}
+
+##################################
+# Takes a single layer's data and returns it as a dictionary with keys width, height and graphic (see the top of the file).
+##################################
+
+def parse_layer_array(layer_string):
+	width, height = np.frombuffer(layer_string, dtype="<u4", count=2)
+	width = int(width)
+	height = int(height)
 
-		cells.append(row)
+	cells = np.frombuffer(layer_string, dtype=xp_cell_dt, count=width * height, offset=layer_width_bytes + layer_height_bytes)
+	cells = cells.reshape(width, height)
+
+	graphic = np.empty((width, height), dtype=graphic_dt)
+	graphic["ch"] = cp437[cells["keycode"]]
+	graphic["fg"] = cells["fore"]
+	graphic["bg"] = cells["back"]
 
 	return {
 		'width':width,
 		'height':height,
-		'cells':cells
+		'graphic':graphic
 	}
 
 ##################################
-# Pulls out the keycode and the foreground/background RGB values from a single cell's data, returning them in the format listed at the top of this file for a single cell.
+# A layer from parse_layer_array that holds on to its raw data and only decodes it the first time layer['graphic'] is read.
+# width and height are available straight away from the lookahead.
+##################################
+
+class LazyXPLayer(dict):
+	def __init__(self, layer_string, width, height):
+		super().__init__(width=width, height=height)
+		self.layer_string = layer_string
+
+	def __missing__(self, key):
+		if key != 'graphic':
+			raise KeyError(key)
+
+		self['graphic'] = parse_layer_array(self.layer_string)['graphic']
+		self.layer_string = None
+		return self['graphic']
+
+##################################
+# Converts an array layer from parse_layer_array back into the old cells format, for callers that still index cells[x][y].
 ##################################
 
+def graphic_to_cells(graphic):
+	chars = graphic["ch"].tolist()
+	fores = graphic["fg"].tolist()
+	backs = graphic["bg"].tolist()
+
+	return [
+		[(ch, tuple(fore), tuple(back)) for ch, fore, back in zip(chars[x], fores[x], backs[x])]
+		for x in range(len(chars))
+	]
+
+##################################
+# loads in a gzipped .xp file from disk, returning the array format described at the top of the file.
+# Goes through the compiled asset cache unless use_cache is False, layers that come from the cache are read-only memory maps.
+# layers works the same as in load_xp_array, only the requested layers are read from (or added to) the cache.
+##################################
+
+def load_xp_file(filepath, layers=None, use_cache=True):
+	with open(filepath, "rb") as xp_file:
+		compressed_data = xp_file.read()
+
+	if not use_cache:
+		return load_xp_array(gzip.decompress(compressed_data), layers)
+
+	cache_key = hashlib.sha1(compressed_data).hexdigest() + "-" + str(xp_cache_format)
+	file_string = None
+
+	header = read_cached_header(cache_key)
+	if header is None:
+		file_string = gzip.decompress(compressed_data)
+		header = read_xp_header(file_string)
+		write_cached_header(cache_key, header)
+
+	layer_data = []
+	for layer, (width, height) in enumerate(header['layer_sizes']):
+		if layers is not None and layer not in layers:
+			layer_data.append(None)
+			continue
+
+		graphic = read_cached_layer(cache_key, layer, width, height)
+		if graphic is None:
+			if file_string is None:
+				file_string = gzip.decompress(compressed_data)
+			offset = header['layer_offsets'][layer]
+			layer_data_size = layer_width_bytes + layer_height_bytes + (layer_cell_bytes * width * height)
+			graphic = parse_layer_array(memoryview(file_string)[offset:offset + layer_data_size])['graphic']
+			write_cached_layer(cache_key, layer, graphic)
+
+		layer_data.append({'width':width, 'height':height, 'graphic':graphic})
+
+	return {
+		'version':header['version'],
+		'layer_count':header['layer_count'],
+		'width':header['width'],
+		'height':header['height'],
+		'layer_data':layer_data
+	}
+
+def xp_cache_file(cache_key, layer=None):
+	if layer is None:
+		return os.path.join(xp_cache_dir, cache_key + ".json")
+	return os.path.join(xp_cache_dir, cache_key + "." + str(layer) + ".npy")
+
+##################################
+# The readers return None for a missing or stale entry (a layer file not matching the header), so the caller rebuilds it
+##################################
+
+def read_cached_header(cache_key):
+	try:
+		with open(xp_cache_file(cache_key)) as f:
+			header = json.load(f)
+		header['layer_sizes'] = [tuple(size) for size in header['layer_sizes']]
+		if len(header['layer_sizes']) != header['layer_count'] or len(header['layer_offsets']) != header['layer_count']:
+			return None
+	except (OSError, ValueError, KeyError, TypeError):
+		return None
+
+	return header
+
+def read_cached_layer(cache_key, layer, width, height):
+	try:
+		graphic = np.load(xp_cache_file(cache_key, layer), mmap_mode="r", allow_pickle=False)
+	except (OSError, ValueError, EOFError):
+		return None
+
+	if graphic.dtype != graphic_dt or graphic.shape != (width, height):
+		return None
+
+	return graphic
+
+##################################
+# Everything goes through a temporary file of its own, so a half written entry is never read back as valid and
+# processes writing the same entry at once (generate_worlds.py's workers) don't trip over each other's files.
+# Failing to write (read-only install, full disk, losing the race to another process) isn't fatal, the file just gets parsed again next time.
+##################################
+
+def write_cached_header(cache_key, header):
+	write_cache_file(xp_cache_file(cache_key), lambda f: f.write(json.dumps(header).encode()))
+
+def write_cached_layer(cache_key, layer, graphic):
+	write_cache_file(xp_cache_file(cache_key, layer), lambda f: np.save(f, graphic, allow_pickle=False))
+
+def write_cache_file(path, write):
+	temp_path = None
+	try:
+		os.makedirs(xp_cache_dir, exist_ok=True)
+		temp_file, temp_path = tempfile.mkstemp(dir=xp_cache_dir, prefix=os.path.basename(path) + ".", suffix=".tmp")
+		with os.fdopen(temp_file, "wb") as f:
+			write(f)
+		os.replace(temp_path, path)
+		temp_path = None
+	except OSError as e:
+		# Another process finishing the same entry first is fine, its copy is just as good
+		if not os.path.isfile(path):
+			warnings.warn("Couldn't write xp cache file " + path + ": " + str(e), RuntimeWarning)
+	finally:
+		if temp_path is not None and os.path.exists(temp_path):
+			os.remove(temp_path)
+
+##################################
+# Converts every layer of the array format into the cells format described at the top of the file.
+##################################
+
+def xp_array_to_cells(xp_data):
+	xp_data = dict(xp_data)
+	xp_data['layer_data'] = [layer_to_cells(layer) for layer in xp_data['layer_data']]
+	return xp_data
+
+##################################
+# loads in an xp file from an unzipped string (gained from opening a .xp file with gzip and calling .read())
+# Compatibility view over load_xp_array that returns layers in the cells format described at the top of the file.
+# reverse_endian is kept so existing calls still work, the .xp format is always little-endian and is always read as such.
+##################################
+
+def load_xp_string(file_string, reverse_endian=True):
+	return xp_array_to_cells(load_xp_array(file_string))
+
+##################################
+# Takes a single layer's data and returns the format listed at the top of the file for a single layer.
+##################################
+
+def parse_layer(layer_string, reverse_endian=True):
+	return layer_to_cells(parse_layer_array(layer_string))
+
+def layer_to_cells(layer):
+	if layer is None:
+		return None
+
+	return {
+		'width':layer['width'],
+		'height':layer['height'],
+		'cells':graphic_to_cells(layer['graphic'])
+	}
+
+##################################
+# Pulls out the keycode and the foreground/background RGB values from a single cell's data, returning them in the format listed at the top of this file for a single cell.
+##################################
 def parse_individual_cell(cell_string, reverse_endian=True):
 	offset = 0
 